@@ -0,0 +1,174 @@
+"""
+Smart Irrigation System - Sensor Fault Detection
+Streaming checks run on every reading before it reaches the dashboard state.
+All per-sensor state is a handful of floats, so each sample is O(1).
+"""
+
+from datetime import datetime
+from threading import Lock
+import time
+
+# Raw ADC rails: a disconnected or shorted probe sits at one of these
+RAW_MIN = 0
+RAW_MAX = 1023
+RAIL_MARGIN = 3
+
+FAULT_DISCONNECTED = "disconnected"
+FAULT_STUCK = "stuck"
+FAULT_SPIKE = "spike"
+FAULT_OUT_OF_RANGE = "out_of_range"
+
+# An aggregated report counts as "flat" only if every sample in it was
+# identical; fewer samples than this say too little to judge
+MIN_FLAT_SAMPLES = 5
+
+
+class _SensorState:
+    """Running statistics for one sensor"""
+
+    __slots__ = ("count", "median", "mad", "ewma", "last_raw", "flat_since",
+                 "last_good", "spike_run", "faults", "fault_count", "last_fault_time")
+
+    def __init__(self):
+        self.count = 0
+        self.median = None   # streaming median estimate
+        self.mad = 0.0       # streaming median absolute deviation estimate
+        self.ewma = None
+        self.last_raw = None
+        self.flat_since = None  # time the raw value stopped moving
+        self.last_good = None
+        self.spike_run = 0   # consecutive readings rejected as spikes
+        self.faults = []
+        self.fault_count = 0
+        self.last_fault_time = None
+
+
+class AnomalyDetector:
+    """
+    Flags readings from a disconnected probe, a stuck value or an
+    implausible jump.
+
+    - disconnected: raw value pinned to an ADC rail
+    - stuck: raw value frozen for `stuck_seconds`. With aggregated
+      reports that means no variation at all within each interval
+      (raw_min == raw_max over several samples) at the same value; plain
+      reports only have the value itself to compare. Being time-based,
+      the check does not depend on the report interval.
+    - spike: robust z-score (|x - median| / MAD) above `z_limit`, or a jump
+      larger than `max_jump` from the last good reading. A jump that holds
+      for `shift_limit` readings is accepted as a real level shift
+      (e.g. the pump has just soaked the soil).
+    - out_of_range: moisture outside 0-100
+    """
+
+    def __init__(self, alpha=0.1, z_limit=6.0, max_jump=40.0, min_jump=5.0,
+                 stuck_seconds=1800, shift_limit=3, warmup=10):
+        self.alpha = alpha
+        self.z_limit = z_limit
+        self.max_jump = max_jump
+        self.min_jump = min_jump
+        self.stuck_seconds = stuck_seconds
+        self.shift_limit = shift_limit
+        self.warmup = warmup
+        self._sensors = {}
+        self._lock = Lock()
+
+    def check(self, sensor_id, moisture, raw_value=None, ts=None, raw_min=None, raw_max=None, samples=None):
+        """
+        Check one reading and update the sensor's state. raw_min, raw_max
+        and samples are the firmware's per-interval aggregates, if reported.
+        Returns a list of fault names; an empty list means the reading is good.
+        """
+        if ts is None:
+            ts = time.time()
+        with self._lock:
+            state = self._sensors.get(sensor_id)
+            if state is None:
+                state = self._sensors[sensor_id] = _SensorState()
+            faults = self._evaluate(state, moisture, raw_value, ts, raw_min, raw_max, samples)
+            state.faults = faults
+            if faults:
+                state.fault_count += 1
+                state.last_fault_time = datetime.utcnow().isoformat() + "Z"
+            return faults
+
+    def _evaluate(self, state, moisture, raw_value, ts, raw_min, raw_max, samples):
+        faults = []
+
+        if raw_value is not None:
+            if raw_value <= RAW_MIN + RAIL_MARGIN or raw_value >= RAW_MAX - RAIL_MARGIN:
+                faults.append(FAULT_DISCONNECTED)
+            if samples is not None and raw_min is not None and raw_max is not None:
+                flat = samples >= MIN_FLAT_SAMPLES and raw_min == raw_max
+            else:
+                flat = True
+            if not flat or raw_value != state.last_raw:
+                state.flat_since = ts if flat else None
+                state.last_raw = raw_value
+            elif state.flat_since is None:
+                state.flat_since = ts
+            if state.flat_since is not None and ts - state.flat_since >= self.stuck_seconds:
+                faults.append(FAULT_STUCK)
+
+        if moisture is None:
+            return faults
+        if moisture < 0 or moisture > 100:
+            faults.append(FAULT_OUT_OF_RANGE)
+            return faults
+
+        if state.median is None:
+            state.median = state.ewma = float(moisture)
+        else:
+            dev = abs(moisture - state.median)
+            if state.count >= self.warmup and dev > self.min_jump:
+                scale = 1.4826 * max(state.mad, 1.0)
+                if dev / scale > self.z_limit:
+                    faults.append(FAULT_SPIKE)
+            if (state.last_good is not None and FAULT_SPIKE not in faults
+                    and abs(moisture - state.last_good) > self.max_jump):
+                faults.append(FAULT_SPIKE)
+
+        if FAULT_SPIKE in faults:
+            state.spike_run += 1
+            if state.spike_run < self.shift_limit:
+                return faults
+            # The "spike" has persisted: re-anchor on the new level
+            faults.remove(FAULT_SPIKE)
+            state.median = float(moisture)
+            state.mad = 0.0
+        state.spike_run = 0
+
+        if FAULT_DISCONNECTED not in faults:
+            self._update_stats(state, float(moisture))
+            state.last_good = moisture
+        return faults
+
+    def _update_stats(self, state, x):
+        """Stochastic median/MAD tracking plus an EWMA, all O(1)"""
+        a = self.alpha
+        state.count += 1
+        state.ewma += a * (x - state.ewma)
+        # Step size follows the spread so the estimate converges quickly
+        step = a * max(state.mad, 1.0)
+        if x > state.median:
+            state.median += min(step, x - state.median)
+        elif x < state.median:
+            state.median -= min(step, state.median - x)
+        state.mad += a * (abs(x - state.median) - state.mad)
+
+    def status(self):
+        """Fault status for every sensor seen so far"""
+        with self._lock:
+            return {
+                sensor_id: {
+                    "ok": not s.faults,
+                    "faults": list(s.faults),
+                    "fault_count": s.fault_count,
+                    "samples": s.count,
+                    "ewma": round(s.ewma, 2) if s.ewma is not None else None,
+                    "median": round(s.median, 2) if s.median is not None else None,
+                    "mad": round(s.mad, 2),
+                    "last_fault_time": s.last_fault_time,
+                }
+                for sensor_id, s in self._sensors.items()
+            }
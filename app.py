@@ -4,35 +4,38 @@ Provides web interface to monitor and control the irrigation system
 Integrated with Arduino serial communication
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, g, render_template, jsonify, request
 from flask_cors import CORS
+from bisect import bisect_right
 from datetime import datetime
-from threading import Lock, Thread
-import serial
+from threading import Lock
+import argparse
 import json
+import os
 import time
 
+from pump_log import PumpLog, parse_time, DEFAULT_ZONE, SOURCE_AUTO, SOURCE_MANUAL
+from anomaly import AnomalyDetector
+from forwarder import Forwarder
+from collector import SiteRegistry, decode_batch
+from auth import ApiKeyStore, RateLimiter, SCOPE_READ, SCOPE_WRITE
+from scheduler import Scheduler, load_forecast, parse_windows
+from ingest import (IngestEngine, SerialTransport, TcpTransport, SimulatorTransport,
+                    CallbackSink, JsonlFileSink, PushSink, DROP_OLDEST, DROP_NEWEST, BLOCK)
+
 app = Flask(__name__)
-CORS(app)
+# Comma-separated list of allowed dashboard origins; "*" keeps the old behaviour
+CORS(app, origins=os.environ.get("SMART_IRRIGATION_CORS_ORIGINS", "*").split(","))
 
 _lock = Lock()
 
 # Serial connection configuration
 SERIAL_PORT = 'COM6'
 BAUD_RATE = 9600
-ser = 9600
 
-def init_serial():
-    """Initialize serial connection with retries"""
-    global ser
-    try:
-        ser = serial.Serial(SERIAL_PORT, baudrate=BAUD_RATE, timeout=1)
-        print(f"Successfully connected to Arduino on {SERIAL_PORT}")
-        time.sleep(2)  # Give Arduino time to reset
-        return True
-    except serial.SerialException as e:
-        print(f"Failed to connect to Arduino: {e}")
-        return False
+# Ingest engine reading from the Arduino (gateway mode only, created at startup)
+_engine = None
+_push = PushSink()
 
 # Store system status
 system_status = {
@@ -47,101 +50,227 @@ _sensor_data = {
     "raw_value": None,
     "pump_status": False,
     "threshold_low": 30,
-    "threshold_high": 60
+    "threshold_high": 60,
+    "faults": []
 }
-_system_status = {"auto_mode": True}
-_history = []  # list of {"timestamp": iso_str, "moisture": value}
+_system_status = {"auto_mode": True, "sample_rate_hz": 10, "report_interval_ms": 2000}
+# list of {"timestamp": iso_str, "moisture": value}; aggregated records
+# from the firmware also carry "min", "max", "std" and "n" (sample count)
+_history = []
+_history_times = []  # epoch seconds per history entry, for ?since= lookups
 _MAX_HISTORY = 500
 
-def read_arduino_data():
+# Extra fields in aggregated records reported once per report interval
+_AGGREGATE_KEYS = ("moisture_min", "moisture_max", "moisture_std",
+                   "raw_min", "raw_max", "raw_std", "samples", "interval_ms")
+
+# Sampling limits, matching the firmware's constrain() bounds
+SAMPLE_RATE_RANGE = (1, 50)
+REPORT_INTERVAL_RANGE = (500, 60000)
+_pump_log = PumpLog()
+_detector = AnomalyDetector()
+_scheduler = Scheduler()
+
+# Multi-site operation: a gateway may forward to a collector, and a
+# collector aggregates readings from many gateways
+MODE_GATEWAY = "gateway"
+MODE_COLLECTOR = "collector"
+_mode = MODE_GATEWAY
+_forwarder = None
+_sites = SiteRegistry()
+
+def _entry_time(entry):
+    """Epoch seconds of a history entry, kept non-decreasing so it can be bisected"""
+    try:
+        t = parse_time(entry["timestamp"])
+    except (TypeError, ValueError):
+        t = time.time()
+    return max(t, _history_times[-1]) if _history_times else t
+
+def _history_since(since):
+    """History entries newer than `since` (epoch seconds), or all of it for None"""
+    if since is None:
+        return list(_history)
+    return _history[bisect_right(_history_times, since):]
+
+def _payload_error(payload):
+    """Why a device record cannot be applied, or None if it is usable"""
+    if not isinstance(payload, dict):
+        return "payload must be a JSON object"
+    if not isinstance(payload.get("zone", DEFAULT_ZONE), str):
+        return "zone must be a string"
+    for k in ("moisture", "raw_value", "raw_min", "raw_max", "samples"):
+        value = payload.get(k)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f"{k} must be a number"
+    return None
+
+def _apply_payload(payload):
     """
-    Background thread function to continuously read data from Arduino
+    Merge a reading from the device into the current state.
+    Must be called with _lock held.
     """
-    global ser
-    
-    while True:
-        try:
-            # Try to initialize serial connection if not connected
-            if ser is None or not hasattr(ser, 'is_open') or not ser.is_open:
-                if not init_serial():
-                    print("Failed to connect to Arduino, retrying in 5 seconds...")
-                    time.sleep(5)
-                    continue
-            
-            # Check if there's data to read
-            if ser.in_waiting > 0:
-                try:
-                    # Read line from Arduino
-                    data = ser.readline().decode('utf-8', errors='replace').strip()
-                    print(f"Received from Arduino: {data}")
-                    
-                    # Try to parse as JSON
-                    try:
-                        payload = json.loads(data)
-                        
-                        # Update sensor data with lock
-                        with _lock:
-                            # Update sensor data fields that exist in payload
-                            for k in ("moisture", "raw_value", "pump_status", "threshold_low", "threshold_high"):
-                                if k in payload:
-                                    _sensor_data[k] = payload[k]
-                            
-                            # Append to history
-                            if _sensor_data.get("moisture") is not None:
-                                _history.append({
-                                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                                    "moisture": _sensor_data.get("moisture")
-                                })
-                                
-                                # Truncate history if needed
-                                if len(_history) > _MAX_HISTORY:
-                                    del _history[0: len(_history) - _MAX_HISTORY]
-                        
-                        print(f"Updated sensor data: moisture={_sensor_data.get('moisture')}%, pump={_sensor_data.get('pump_status')}")
-                        
-                    except json.JSONDecodeError:
-                        # If not JSON, just log it as raw data
-                        print(f"Non-JSON data: {data}")
-                        
-                except Exception as e:
-                    print(f"Error reading/parsing data: {e}")
-            
-            time.sleep(0.1)  # Small delay to prevent CPU spinning
-            
-        except serial.SerialException as e:
-            print(f"Serial connection error: {e}")
-            print(f"Could not connect to {SERIAL_PORT}. Please check:")
-            print("1. Arduino is connected")
-            print("2. Correct COM port")
-            print("3. No other program is using the port")
-            if ser:
-                try:
-                    ser.close()
-                except:
-                    pass
-                ser = None
-            time.sleep(5)  # Wait before retrying
-            
-        except Exception as e:
-            print(f"Unexpected error in Arduino reader: {e}")
-            time.sleep(5)  # Wait before retrying
+    zone = payload.get("zone", DEFAULT_ZONE)
+    faults = []
+    if "moisture" in payload or "raw_value" in payload:
+        faults = _detector.check(zone, payload.get("moisture"), payload.get("raw_value"),
+                                 raw_min=payload.get("raw_min"), raw_max=payload.get("raw_max"),
+                                 samples=payload.get("samples"))
+        _sensor_data["faults"] = faults
+
+    for k in ("moisture", "raw_value", "pump_status", "threshold_low", "threshold_high") + _AGGREGATE_KEYS:
+        # A faulty moisture reading is reported via "faults" but never stored
+        if k in payload and not (faults and k == "moisture"):
+            _sensor_data[k] = payload[k]
+
+    # Record pump edges; the firmware drives the pump itself in auto mode
+    if "pump_status" in payload:
+        source = SOURCE_AUTO if _system_status.get("auto_mode", True) else SOURCE_MANUAL
+        _pump_log.record(payload["pump_status"], source, zone)
+
+    # Append to history
+    if faults:
+        print(f"Sensor fault on {zone}: {', '.join(faults)} (moisture={payload.get('moisture')}, raw={payload.get('raw_value')})")
+    elif _sensor_data.get("moisture") is not None:
+        entry = {
+            "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat() + "Z",
+            "moisture": _sensor_data.get("moisture")
+        }
+        if "samples" in payload:
+            entry["min"] = payload.get("moisture_min")
+            entry["max"] = payload.get("moisture_max")
+            entry["std"] = payload.get("moisture_std")
+            entry["n"] = payload["samples"]
+        _history.append(entry)
+        _history_times.append(_entry_time(entry))
+
+        # Re-plan the next run; only push while idle so a run in progress is not
+        # cut short, and only in auto mode since the device ignores it otherwise.
+        # An unpushed plan is offered again on the next reading.
+        plan = _scheduler.observe(zone, _sensor_data["moisture"], bool(_sensor_data.get("pump_status")),
+                                  _sensor_data.get("threshold_low", 30), _sensor_data.get("threshold_high", 60))
+        if plan is not None and not _sensor_data.get("pump_status") and _system_status.get("auto_mode", True):
+            _push_schedule(plan)
+        if _forwarder is not None:
+            _forwarder.submit(dict(entry,
+                                   zone=zone,
+                                   raw_value=_sensor_data.get("raw_value"),
+                                   pump_status=_sensor_data.get("pump_status")))
+
+        # Truncate history if needed
+        if len(_history) > _MAX_HISTORY:
+            del _history[0: len(_history) - _MAX_HISTORY]
+            del _history_times[0: len(_history_times) - _MAX_HISTORY]
+
+def _push_schedule(plan):
+    """Arm (or cancel) the next scheduled run on the device"""
+    if plan["start"] is None:
+        sent = send_command_to_arduino({"schedule_run_s": 0})
+    else:
+        sent = send_command_to_arduino({
+            "schedule_in_s": max(0, int(plan["start"] - time.time())),
+            "schedule_run_s": plan["duration_s"]
+        })
+    if sent:
+        _scheduler.mark_pushed(plan["zone"], plan)
+
+def _rearm_schedule():
+    """Push the current plans again; the device forgets them on reset or in manual mode"""
+    for plan in _scheduler.pending():
+        _push_schedule(plan)
+
+def _on_record(payload):
+    """Ingest sink: merge each record from the device into the dashboard state"""
+    error = _payload_error(payload)
+    if error:
+        print(f"Ignoring record from device: {error}")
+        return
+    with _lock:
+        _apply_payload(payload)
+    print(f"Updated sensor data: moisture={_sensor_data.get('moisture')}%, pump={_sensor_data.get('pump_status')}")
+
+def _on_connect():
+    """The board resets on connect, so restore the configured sampling and schedule"""
+    with _lock:
+        sampling = {k: _system_status[k] for k in ("sample_rate_hz", "report_interval_ms")}
+        auto_mode = _system_status.get("auto_mode", True)
+    send_command_to_arduino(sampling)
+    if auto_mode:
+        _rearm_schedule()
+
+def create_engine(transport, record_path=None, backpressure=DROP_OLDEST):
+    """Build the ingest engine feeding this app from the given transport"""
+    sinks = [CallbackSink(_on_record, "dashboard"), _push]
+    if record_path:
+        sinks.append(JsonlFileSink(record_path))
+    return IngestEngine(transport, sinks, backpressure=backpressure, on_connect=_on_connect)
+
+# API keys are optional: with no key file every request is allowed,
+# but rate limits always apply
+_api_keys = ApiKeyStore.from_env()
+_rate_limiter = RateLimiter()
+_PUBLIC_ENDPOINTS = ("index", "static")
+# Endpoints that list several zones; they filter by the key's zones instead
+_LISTING_ENDPOINTS = ("get_sites", "get_pump_stats", "get_schedule")
+
+def _zone_allowed(zone, scope=SCOPE_READ):
+    """Whether the request's API key (if keys are enabled) may access a zone"""
+    key = g.get("api_key")
+    return key is None or ApiKeyStore.allows(key, scope, zone)
+
+@app.before_request
+def check_access():
+    """Authenticate the API key, enforce its zone scope and rate limit the client"""
+    if request.endpoint in _PUBLIC_ENDPOINTS:
+        return None
+    scope = SCOPE_READ if request.method in ("GET", "HEAD", "OPTIONS") else SCOPE_WRITE
+    # Unauthenticated clients are limited per address; nothing they send
+    # (such as X-Site-Id) may pick their bucket
+    client = request.remote_addr
+
+    if _api_keys.enabled and request.method != "OPTIONS":
+        header = request.headers.get("Authorization", "")
+        token = header[7:] if header.startswith("Bearer ") else request.headers.get("X-API-Key")
+        key = _api_keys.authenticate(token)
+        if key is None:
+            return jsonify({"error": "invalid or missing API key"}), 401
+        g.api_key = key
+        # Authorize the resource actually served; collector_ingest checks that
+        # the batch's site_id matches X-Site-Id
+        if request.endpoint == "collector_ingest":
+            zone = request.headers.get("X-Site-Id")
+            if not zone:
+                return jsonify({"error": "X-Site-Id header is required"}), 400
+        elif request.endpoint == "get_site_history":
+            zone = request.view_args["site_id"]
+        elif request.endpoint in _LISTING_ENDPOINTS and not request.args.get("zone"):
+            zone = None
+        else:
+            body = request.get_json(force=True, silent=True) if scope == SCOPE_WRITE else None
+            body = body if isinstance(body, dict) else {}
+            zone = request.args.get("zone") or body.get("zone") or DEFAULT_ZONE
+        if zone is not None and not isinstance(zone, str):
+            return jsonify({"error": "zone must be a string"}), 400
+        if zone is not None and not ApiKeyStore.allows(key, scope, zone):
+            return jsonify({"error": f"API key not allowed to {scope} zone '{zone}'"}), 403
+        client = key["client"]
+        if request.endpoint == "collector_ingest":
+            # Gateways sharing a key each get a bucket for their authorized site
+            client = f"{client}/{zone}"
+
+    retry_after = _rate_limiter.check(client, scope)
+    if retry_after:
+        response = jsonify({"error": "rate limit exceeded"})
+        response.headers["Retry-After"] = str(max(1, round(retry_after)))
+        return response, 429
+    return None
 
 def send_command_to_arduino(command):
     """
-    Send command to Arduino via serial
+    Send command to Arduino via the ingest engine
     command should be a dict that will be sent as JSON
     """
-    global ser
-    if ser and ser.is_open:
-        try:
-            cmd_str = json.dumps(command) + '\n'
-            ser.write(cmd_str.encode('utf-8'))
-            print(f"Sent to Arduino: {cmd_str.strip()}")
-            return True
-        except Exception as e:
-            print(f"Error sending command to Arduino: {e}")
-            return False
-    return False
+    return _engine is not None and _engine.send(command)
 
 @app.route('/')
 def index():
@@ -157,12 +286,17 @@ def get_data():
       "system_status": {...},
       "history": [{timestamp, moisture}, ...]
     }
+    With ?since= (ISO or epoch seconds) history holds only newer readings.
     """
+    try:
+        since = parse_time(request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "invalid since"}), 400
     with _lock:
         return jsonify({
             "sensor_data": _sensor_data.copy(),
             "system_status": _system_status.copy(),
-            "history": list(_history)
+            "history": _history_since(since)
         })
 
 @app.route("/api/ingest", methods=["POST"])
@@ -175,36 +309,42 @@ def ingest():
     payload = request.get_json(force=True, silent=True)
     if not payload:
         return jsonify({"error": "invalid json"}), 400
+    error = _payload_error(payload)
+    if error:
+        return jsonify({"error": error}), 400
 
     with _lock:
-        # update sensor data fields that exist in payload
-        for k in ("moisture", "raw_value", "pump_status", "threshold_low", "threshold_high"):
-            if k in payload:
-                _sensor_data[k] = payload[k]
-
-        # append to history (timestamp as ISO)
-        if _sensor_data.get("moisture") is not None:
-            _history.append({
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "moisture": _sensor_data.get("moisture")
-            })
-            # truncate
-            if len(_history) > _MAX_HISTORY:
-                del _history[0: len(_history) - _MAX_HISTORY]
+        _apply_payload(payload)
 
     return jsonify({"ok": True}), 200
 
 @app.route("/api/control", methods=["POST"])
 def control():
     """
-    Accepts { "auto_mode": bool } or { "manual_pump": bool }
+    Accepts { "auto_mode": bool }, { "manual_pump": bool } and/or
+    { "sample_rate_hz": int, "report_interval_ms": int }
     Sends commands to Arduino if needed
     """
     payload = request.get_json(force=True, silent=True)
     if not payload:
         return jsonify({"error": "invalid json"}), 400
 
+    sampling = {}
+    for key, (lo, hi) in (("sample_rate_hz", SAMPLE_RATE_RANGE), ("report_interval_ms", REPORT_INTERVAL_RANGE)):
+        if key in payload:
+            try:
+                value = int(payload[key])
+            except (TypeError, ValueError):
+                value = None
+            if value is None or not lo <= value <= hi:
+                return jsonify({"error": f"{key} must be between {lo} and {hi}"}), 400
+            sampling[key] = value
+
     with _lock:
+        if sampling:
+            _system_status.update(sampling)
+            send_command_to_arduino(sampling)
+
         if "auto_mode" in payload:
             auto_mode = bool(payload["auto_mode"])
             _system_status["auto_mode"] = auto_mode
@@ -212,6 +352,8 @@ def control():
             
             # Send command to Arduino
             send_command_to_arduino({"auto_mode": auto_mode})
+            if auto_mode:
+                _rearm_schedule()
             
         if "manual_pump" in payload:
             # manual_pump true -> force pump on, false -> pump off
@@ -221,51 +363,210 @@ def control():
             _system_status["auto_mode"] = False
             system_status['auto_mode'] = False
             
-            # Send command to Arduino
-            send_command_to_arduino({"manual_pump": manual_pump, "auto_mode": False})
+            # Send command to Arduino; only a delivered command is a real pump edge
+            if send_command_to_arduino({"manual_pump": manual_pump, "auto_mode": False}):
+                _pump_log.record(manual_pump, SOURCE_MANUAL, payload.get("zone", DEFAULT_ZONE))
 
     return jsonify({"ok": True, "system_status": _system_status, "sensor_data": _sensor_data})
 
 @app.route('/api/history')
 def get_history():
-    """API endpoint to get full data history"""
+    """
+    API endpoint to get the data history.
+    Optional query param: since (ISO or epoch seconds) for only newer readings
+    """
+    try:
+        since = parse_time(request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "invalid since"}), 400
     with _lock:
-        return jsonify(list(_history))
+        return jsonify(_history_since(since))
+
+@app.route('/api/pump/events')
+def get_pump_events():
+    """
+    Pump on/off events for a zone.
+    Optional query params: zone, start, end (ISO or epoch seconds), limit
+    """
+    zone = request.args.get("zone", DEFAULT_ZONE)
+    try:
+        start = parse_time(request.args.get("start"))
+        end = parse_time(request.args.get("end"))
+        limit = request.args.get("limit", type=int)
+    except ValueError:
+        return jsonify({"error": "invalid time range"}), 400
+    return jsonify(_pump_log.events(start, end, zone, limit))
+
+@app.route('/api/pump/stats')
+def get_pump_stats():
+    """
+    Pump runtime, cycles per hour and estimated litres per zone.
+    With start/end the totals cover only that range.
+    """
+    try:
+        start = parse_time(request.args.get("start"))
+        end = parse_time(request.args.get("end"))
+    except ValueError:
+        return jsonify({"error": "invalid time range"}), 400
+    zone = request.args.get("zone")
+    zones = [zone] if zone else [z for z in (_pump_log.zones() or [DEFAULT_ZONE]) if _zone_allowed(z)]
+    if start is None and end is None:
+        stats = [_pump_log.totals(z) for z in zones]
+    else:
+        stats = [_pump_log.range_totals(start, end, z) for z in zones]
+    return jsonify({"flow_rate_lpm": _pump_log.flow_rate_lpm, "zones": stats})
+
+@app.route('/api/stream')
+def stream():
+    """Server-sent events: every record from the device as it arrives"""
+    def events():
+        queue = _push.subscribe()
+        try:
+            while True:
+                record = PushSink.get(queue, timeout=15)
+                yield f"data: {json.dumps(record)}\n\n" if record else ": keepalive\n\n"
+        finally:
+            _push.unsubscribe(queue)
+    return Response(events(), mimetype="text/event-stream")
+
+@app.route('/api/schedule')
+def get_schedule():
+    """Planned pump runs and the fitted drying/wetting model per zone the key may read"""
+    only = request.args.get("zone")
+    return jsonify({zone: plan for zone, plan in _scheduler.plans().items()
+                    if (only is None or zone == only) and _zone_allowed(zone)})
+
+@app.route('/api/collector/ingest', methods=['POST'])
+def collector_ingest():
+    """
+    Receives batches from edge gateways (collector mode only).
+    Body is {"site_id": ..., "readings": [...]}, optionally gzip-encoded.
+    """
+    if _mode != MODE_COLLECTOR:
+        return jsonify({"error": "not running in collector mode"}), 404
+    try:
+        payload = decode_batch(request.get_data(), request.headers.get("Content-Encoding"))
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"invalid batch: {e}"}), 400
+    header_site = request.headers.get("X-Site-Id")
+    if header_site and payload.get("site_id") not in (None, header_site):
+        return jsonify({"error": "site_id does not match X-Site-Id"}), 403
+    site_id = payload.get("site_id") or header_site
+    readings = payload.get("readings")
+    if not site_id or not isinstance(readings, list):
+        return jsonify({"error": "site_id and readings are required"}), 400
+    if not _zone_allowed(site_id, SCOPE_WRITE):
+        return jsonify({"error": f"API key not allowed to write zone '{site_id}'"}), 403
+    stored = _sites.ingest(site_id, readings)
+    return jsonify({"ok": True, "stored": stored}), 200
+
+@app.route('/api/sites')
+def get_sites():
+    """Latest reading per zone for every forwarding site the key may read"""
+    return jsonify([site for site in _sites.sites() if _zone_allowed(site["site_id"])])
+
+@app.route('/api/sites/<site_id>/history')
+def get_site_history(site_id):
+    """Forwarded readings for one site"""
+    history = _sites.history(site_id, request.args.get("limit", type=int))
+    if history is None:
+        return jsonify({"error": "unknown site"}), 404
+    return jsonify(history)
 
 @app.route('/api/status')
 def get_status():
     """Check if Arduino connection is active"""
-    global ser
-    is_connected = ser is not None and ser.is_open
+    is_connected = _engine is not None and _engine.connected
+    sensor_faults = _detector.status()
     return jsonify({
+        "mode": _mode,
+        "forwarder": _forwarder.status() if _forwarder is not None else None,
         "arduino_connected": is_connected,
-        "port": SERIAL_PORT,
-        "baud_rate": BAUD_RATE
+        "port": _engine.transport.name if _engine is not None else SERIAL_PORT,
+        "baud_rate": BAUD_RATE,
+        "ingest": _engine.stats() if _engine is not None else None,
+        "sensors_ok": all(s["ok"] for s in sensor_faults.values()),
+        "sensor_faults": sensor_faults
     })
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smart Irrigation System dashboard")
+    parser.add_argument("--mode", choices=[MODE_GATEWAY, MODE_COLLECTOR], default=MODE_GATEWAY,
+                        help="gateway reads the Arduino; collector aggregates many gateways")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--debug", action="store_true",
+                        help="enable the Flask debugger (never on an address others can reach)")
+    parser.add_argument("--transport", choices=["serial", "tcp", "sim"], default="serial",
+                        help="where readings come from; sim needs no hardware")
+    parser.add_argument("--serial-port", default=SERIAL_PORT)
+    parser.add_argument("--tcp", metavar="HOST:PORT", help="address for the tcp transport")
+    parser.add_argument("--record", metavar="FILE", help="also append every reading to a JSON-lines file")
+    parser.add_argument("--backpressure", choices=[DROP_OLDEST, DROP_NEWEST, BLOCK], default=DROP_OLDEST,
+                        help="what to do when sinks fall behind the device")
+    parser.add_argument("--forward-to", metavar="URL",
+                        help="collector base URL, e.g. http://collector:6000")
+    parser.add_argument("--site-id", default="site-1", help="name of this site at the collector")
+    parser.add_argument("--spool-dir", default="spool",
+                        help="where undelivered batches are kept while the uplink is down")
+    parser.add_argument("--forecast", metavar="FILE",
+                        help="local weather forecast (CSV or JSON) used by the scheduler")
+    parser.add_argument("--off-peak", default="",
+                        help="off-peak power windows in local hours, e.g. 22-6,12-14")
+    parser.add_argument("--api-key", default=os.environ.get("SMART_IRRIGATION_FORWARD_KEY"),
+                        help="API key presented to the collector when forwarding")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
+    _mode = args.mode
+    SERIAL_PORT = args.serial_port
+
     print("="*60)
-    print("Smart Irrigation System - Starting...")
+    print(f"Smart Irrigation System - Starting ({_mode} mode)...")
     print("="*60)
     
-    # Start Arduino reader thread
-    arduino_thread = Thread(target=read_arduino_data, daemon=True)
-    arduino_thread.start()
-    print(f"Arduino reader thread started on {SERIAL_PORT}")
-    
-    # Give the serial connection a moment to establish
-    time.sleep(2)
+    if _mode == MODE_GATEWAY:
+        if args.forecast:
+            _scheduler.forecast = load_forecast(args.forecast)
+            print(f"Loaded forecast from {args.forecast}")
+        _scheduler.off_peak = parse_windows(args.off_peak)
+
+        # Start the ingest engine (reader + dispatcher threads)
+        if args.transport == "tcp":
+            host, _, port = (args.tcp or "").rpartition(":")
+            transport = TcpTransport(host or "127.0.0.1", int(port or 7000))
+        elif args.transport == "sim":
+            transport = SimulatorTransport()
+        else:
+            transport = SerialTransport(SERIAL_PORT, BAUD_RATE)
+        _engine = create_engine(transport, args.record, args.backpressure)
+        _engine.start()
+        print(f"Ingest engine started on {transport.name}")
+
+        if args.forward_to:
+            _forwarder = Forwarder(args.forward_to, args.site_id, spool_dir=args.spool_dir,
+                                   api_key=args.api_key)
+            _forwarder.start()
+            print(f"Forwarding readings to {args.forward_to} as '{args.site_id}'")
+
+        # Give the serial connection a moment to establish
+        time.sleep(2)
     
     print("\n" + "="*60)
     print("Flask Dashboard starting...")
-    print("Dashboard available at: http://127.0.0.1:5000")
+    print(f"Dashboard available at: http://{args.host}:{args.port}")
+    if _api_keys.enabled:
+        print("API keys required (open the dashboard with ?key=<your key>)")
     print("="*60)
     print("\nPress Ctrl+C to stop the server\n")
     
     try:
-        app.run(debug=True, host='127.0.0.1', port=5000, use_reloader=False)
+        app.run(debug=args.debug, host=args.host, port=args.port, threaded=True, use_reloader=False)
     except KeyboardInterrupt:
         print("\n\nShutting down...")
-        if ser and ser.is_open:
-            ser.close()
+        if _forwarder is not None:
+            _forwarder.stop()
+        if _engine is not None:
+            _engine.stop()
         print("Server stopped.")
\ No newline at end of file
@@ -7,12 +7,12 @@ Integrated with Arduino serial communication
 from flask import Flask, render_template, jsonify, request
 from flask_cors import CORS
 from datetime import datetime
-from threading import Lock, Thread
-import serial
+from threading import Lock
 import serial.tools.list_ports
-import json
 import time
 
+from ingest import IngestEngine, SerialTransport, CallbackSink
+
 app = Flask(__name__)
 CORS(app)
 
@@ -21,53 +21,6 @@ _lock = Lock()
 # Serial connection configuration
 SERIAL_PORT = 'COM6'
 BAUD_RATE = 9600
-ser = None
-
-def init_serial():
-    """Initialize serial connection with retries"""
-    global ser
-    max_attempts = 3
-    
-    # First, make sure any existing connection is closed
-    if ser is not None:
-        try:
-            ser.close()
-        except:
-            pass
-        ser = None
-        time.sleep(1)  # Wait for port to be released
-    
-    # Try to open the port with different parameters
-    for attempt in range(max_attempts):
-        try:
-            # Try to open with exclusive access
-            ser = serial.Serial(
-                port=SERIAL_PORT,
-                baudrate=BAUD_RATE,
-                timeout=1,
-                write_timeout=1,
-                exclusive=True
-            )
-            print(f"Successfully connected to Arduino on {SERIAL_PORT}")
-            time.sleep(2)  # Give Arduino time to reset
-            return True
-        except serial.SerialException as e:
-            print(f"Attempt {attempt + 1}/{max_attempts}: Failed to connect to Arduino: {e}")
-            if "PermissionError" in str(e):
-                print("Permission denied. Please try:")
-                print("1. Close Arduino IDE and any other programs using the port")
-                print("2. Unplug and replug the Arduino")
-                print("3. Run this program with administrator privileges")
-            time.sleep(1)
-            
-            # Try to clean up
-            if ser is not None:
-                try:
-                    ser.close()
-                except:
-                    pass
-                ser = None
-    return False
 
 # Store system status
 system_status = {
@@ -88,86 +41,34 @@ _system_status = {"auto_mode": True}
 _history = []  # list of {"timestamp": iso_str, "moisture": value}
 _MAX_HISTORY = 500
 
-def read_arduino_data():
-    """
-    Background thread function to continuously read data from Arduino
-    """
-    global ser
-    
-    while True:
-        try:
-            # Try to initialize serial if not connected
-            if ser is None or not ser.is_open:
-                if not init_serial():
-                    print("Failed to connect to Arduino, retrying in 5 seconds...")
-                    time.sleep(5)
-                    continue
+def _on_record(payload):
+    """Ingest sink: merge each record from the Arduino into the dashboard state"""
+    with _lock:
+        # Update sensor data fields that exist in payload
+        for k in ("moisture", "raw_value", "pump_status", "threshold_low", "threshold_high"):
+            if k in payload:
+                _sensor_data[k] = payload[k]
 
-            if ser.in_waiting > 0:
-                try:
-                    # Read line from Arduino
-                    data = ser.readline().decode('utf-8', errors='replace').strip()
-                    print(f"Received from Arduino: {data}")
-                    
-                    # Try to parse as JSON
-                    try:
-                        payload = json.loads(data)
-                        
-                        # Update sensor data with lock
-                        with _lock:
-                            # Update sensor data fields that exist in payload
-                            for k in ("moisture", "raw_value", "pump_status", "threshold_low", "threshold_high"):
-                                if k in payload:
-                                    _sensor_data[k] = payload[k]
-                            
-                            # Append to history
-                            if _sensor_data.get("moisture") is not None:
-                                _history.append({
-                                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                                    "moisture": _sensor_data.get("moisture")
-                                })
-                                
-                                # Truncate history if needed
-                                if len(_history) > _MAX_HISTORY:
-                                    del _history[0: len(_history) - _MAX_HISTORY]
-                        
-                        print(f"Updated sensor data: moisture={_sensor_data.get('moisture')}%, pump={_sensor_data.get('pump_status')}")
-                        
-                    except json.JSONDecodeError:
-                        # If not JSON, just log it as raw data
-                        print(f"Non-JSON data: {data}")
-                        
-                except Exception as e:
-                    print(f"Error reading/parsing data: {e}")
-            
-            time.sleep(0.1)  # Small delay to prevent CPU spinning
-            
-        except serial.SerialException as e:
-            print(f"Serial connection error: {e}")
-            if ser:
-                try:
-                    ser.close()
-                except:
-                    pass
-                ser = None
-            time.sleep(5)  # Wait before retrying
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            time.sleep(5)  # Wait before retrying
+        # Append to history
+        if _sensor_data.get("moisture") is not None:
+            _history.append({
+                "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat() + "Z",
+                "moisture": _sensor_data.get("moisture")
+            })
+
+            # Truncate history if needed
+            if len(_history) > _MAX_HISTORY:
+                del _history[0: len(_history) - _MAX_HISTORY]
+
+    print(f"Updated sensor data: moisture={_sensor_data.get('moisture')}%, pump={_sensor_data.get('pump_status')}")
+
+# Open with exclusive access so a second program cannot grab the port
+_engine = IngestEngine(SerialTransport(SERIAL_PORT, BAUD_RATE, exclusive=True),
+                       [CallbackSink(_on_record, "dashboard")])
 
 def send_command_to_arduino(command):
     """Send a command to Arduino"""
-    global ser
-    
-    try:
-        if ser and ser.is_open:
-            command_str = json.dumps(command) + "\n"
-            ser.write(command_str.encode())
-            print(f"Sent to Arduino: {command_str.strip()}")
-            return True
-    except Exception as e:
-        print(f"Error sending command: {e}")
-    return False
+    return _engine.send(command)
 
 @app.route('/')
 def index():
@@ -220,12 +121,11 @@ def get_history():
 @app.route('/api/status')
 def get_status():
     """Check if Arduino connection is active"""
-    global ser
-    is_connected = ser is not None and ser.is_open
     return jsonify({
-        "arduino_connected": is_connected,
+        "arduino_connected": _engine.connected,
         "port": SERIAL_PORT,
-        "baud_rate": BAUD_RATE
+        "baud_rate": BAUD_RATE,
+        "ingest": _engine.stats()
     })
 
 def list_com_ports():
@@ -243,9 +143,8 @@ if __name__ == '__main__':
     # List available COM ports
     list_com_ports()
     
-    # Start Arduino reader thread
-    arduino_thread = Thread(target=read_arduino_data, daemon=True)
-    arduino_thread.start()
+    # Start the ingest engine (reader + dispatcher threads)
+    _engine.start()
     print(f"Arduino reader thread started")
     
     # Give the serial connection a moment to establish
@@ -261,6 +160,5 @@ if __name__ == '__main__':
         app.run(debug=True, host='127.0.0.1', port=5000, use_reloader=False)
     except KeyboardInterrupt:
         print("\n\nShutting down...")
-        if ser and ser.is_open:
-            ser.close()
+        _engine.stop()
         print("Server stopped.")
\ No newline at end of file
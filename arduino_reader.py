@@ -1,99 +1,66 @@
 """
 Smart Irrigation System - Arduino Serial Reader
 Reads data from Arduino via serial port and provides it to Flask app
+Built on the shared IngestEngine (see ingest.py)
 """
 
-import serial
-import json
-import threading
-import time
 from datetime import datetime
 
+from ingest import IngestEngine, SerialTransport, RingBufferSink
+
 class ArduinoReader:
-    def __init__(self, port='COM3', baudrate=9600):
+    def __init__(self, port='COM3', baudrate=9600, max_history=500):
         """
         Initialize Arduino serial connection
         Change 'COM3' to your actual port (e.g., '/dev/ttyUSB0' on Linux/Mac)
         """
         self.port = port
         self.baudrate = baudrate
-        self.serial_connection = None
-        self.current_data = {
+        self.max_history = max_history
+        self._ring = RingBufferSink(maxlen=max_history)
+        self.engine = IngestEngine(SerialTransport(port, baudrate), [self._ring])
+        self._empty = {
             'moisture': 0,
             'raw_value': 0,
             'pump_status': False,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.utcnow().isoformat() + "Z"
         }
-        self.data_history = []
-        self.max_history = 50  # Keep last 50 readings
-        self.running = False
-        self.thread = None
-        
+
+    @property
+    def running(self):
+        return self.engine.running
+
     def connect(self):
         """Establish connection to Arduino"""
-        try:
-            self.serial_connection = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=1
-            )
-            print(f"Connected to Arduino on {self.port}")
-            return True
-        except Exception as e:
-            print(f"Error connecting to Arduino: {e}")
-            return False
-    
+        return self.engine.connect()
+
     def start_reading(self):
-        """Start the background thread for reading data"""
+        """Start the background threads for reading data"""
         if not self.connect():
             return False
-            
-        self.running = True
-        self.thread = threading.Thread(target=self._read_loop)
-        self.thread.daemon = True
-        self.thread.start()
+        self.engine.start()
         return True
-    
+
     def stop_reading(self):
-        """Stop the background reading thread"""
-        self.running = False
-        if self.serial_connection and self.serial_connection.is_open:
-            self.serial_connection.close()
-    
-    def _read_loop(self):
-        """Background thread that continuously reads from Arduino"""
-        while self.running:
-            try:
-                if self.serial_connection and self.serial_connection.in_waiting > 0:
-                    line = self.serial_connection.readline().decode('utf-8').strip()
-                    
-                    if line and line.startswith('{'):
-                        # Parse JSON data from Arduino
-                        data = json.loads(line)
-                        data['timestamp'] = datetime.now().isoformat()
-                        
-                        # Update current data
-                        self.current_data = data
-                        
-                        # Add to history
-                        self.data_history.append(data.copy())
-                        
-                        # Keep only recent history
-                        if len(self.data_history) > self.max_history:
-                            self.data_history.pop(0)
-                            
-                        print(f"Moisture: {data['moisture']}% | Pump: {'ON' if data['pump_status'] else 'OFF'}")
-                        
-            except json.JSONDecodeError:
-                print("Error parsing JSON from Arduino")
-            except Exception as e:
-                print(f"Error reading from Arduino: {e}")
-                time.sleep(2)  # Wait before retrying
-    
+        """Stop the background reading threads"""
+        self.engine.stop()
+
+    def send_command(self, command):
+        """Send a command dict to the Arduino as JSON"""
+        return self.engine.send(command)
+
+    @property
+    def current_data(self):
+        return self._ring.latest or self._empty
+
+    @property
+    def data_history(self):
+        return self._ring.items()
+
     def get_current_data(self):
         """Get the most recent sensor data"""
         return self.current_data
-    
+
     def get_history(self):
         """Get all historical sensor data"""
         return self.data_history
@@ -0,0 +1,128 @@
+"""
+Smart Irrigation System - API Keys and Rate Limiting
+Per-zone API keys checked against an in-memory table, and token-bucket
+rate limits per client for read and write requests.
+"""
+
+from threading import Lock
+import hashlib
+import hmac
+import json
+import os
+import time
+
+SCOPE_READ = "read"
+SCOPE_WRITE = "write"
+ALL_ZONES = "*"
+
+# Requests per second and burst size per client
+DEFAULT_READ_RATE = (5.0, 20)
+DEFAULT_WRITE_RATE = (1.0, 5)
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class ApiKeyStore:
+    """
+    API keys loaded once into memory. Keys are indexed by their SHA-256
+    digest, so a lookup costs one hash and one compare_digest regardless of
+    how many keys exist, and raw tokens are not kept around.
+
+    The key file is a JSON object of token -> settings:
+        {"s3cr3t": {"client": "farm-a-dashboard", "zones": ["north"], "scopes": ["read"]}}
+    "zones" may be "*" for every zone; "scopes" defaults to read and write.
+    """
+
+    def __init__(self, keys=None):
+        self._keys = {}
+        for token, settings in (keys or {}).items():
+            self.add(token, **settings)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_env(cls, var="SMART_IRRIGATION_API_KEYS"):
+        """Load from a key file named by an environment variable, if set"""
+        path = os.environ.get(var)
+        return cls.from_file(path) if path else cls()
+
+    @property
+    def enabled(self):
+        return bool(self._keys)
+
+    def add(self, token, client=None, zones=ALL_ZONES, scopes=(SCOPE_READ, SCOPE_WRITE)):
+        digest = _digest(token)
+        self._keys[digest] = {
+            "digest": digest,
+            "client": client or digest.hex()[:8],
+            "zones": ALL_ZONES if zones == ALL_ZONES else frozenset(zones),
+            "scopes": frozenset(scopes),
+        }
+
+    def authenticate(self, token):
+        """Return the key's settings, or None for an unknown token"""
+        if not token:
+            return None
+        digest = _digest(token)
+        entry = self._keys.get(digest)
+        if entry is None or not hmac.compare_digest(entry["digest"], digest):
+            return None
+        return entry
+
+    @staticmethod
+    def allows(entry, scope, zone):
+        if scope not in entry["scopes"]:
+            return False
+        return entry["zones"] == ALL_ZONES or zone in entry["zones"]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take one token; returns 0 on success or seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per (client, scope)"""
+
+    def __init__(self, read_rate=DEFAULT_READ_RATE, write_rate=DEFAULT_WRITE_RATE, max_clients=10000):
+        self._limits = {SCOPE_READ: read_rate, SCOPE_WRITE: write_rate}
+        self._buckets = {}
+        self._lock = Lock()
+        self.max_clients = max_clients
+
+    def check(self, client, scope):
+        """Returns 0 if the request may proceed, otherwise the suggested retry delay"""
+        now = time.monotonic()
+        key = (client, scope)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._evict(now)
+                bucket = self._buckets[key] = TokenBucket(*self._limits[scope])
+            return bucket.take(now)
+
+    def _evict(self, now):
+        # Drop buckets that have refilled completely; they carry no state
+        for key in [k for k, b in self._buckets.items()
+                    if b.tokens + (now - b.updated) * b.rate >= b.capacity]:
+            del self._buckets[key]
@@ -0,0 +1,344 @@
+"""
+Smart Irrigation System - Strategy Backtester
+Replays recorded moisture and pump history through alternative control
+strategies using a simple soil-moisture response model, and sweeps
+parameter grids across a process pool.
+
+Typical use, with a season recorded by a gateway started with --record
+(every record carries moisture and pump_status, so no pump events are needed):
+    python app.py --record readings.jsonl
+    python backtest.py readings.jsonl --low 20:40:5 --high 50:80:5
+
+/api/history only holds the last 500 readings, but works for a quick look:
+    curl http://127.0.0.1:5000/api/history > history.json
+    curl "http://127.0.0.1:5000/api/pump/events" > pump.json
+    python backtest.py history.json --pump-events pump.json
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import argparse
+import csv
+import json
+import os
+
+from pump_log import DEFAULT_FLOW_RATE_LPM, parse_time
+
+DEFAULT_STEP_S = 60
+DEFAULT_STRESS_THRESHOLD = 30   # the firmware's DRY_THRESHOLD
+DEFAULT_WET_RATE = 1.0          # % per minute of pumping when history has none
+
+
+def load_history(path):
+    """
+    Load [(epoch, moisture, pump_status or None), ...] sorted by time from a
+    JSON-lines file (as written by --record), a JSON list (as returned by
+    /api/history) or a CSV with timestamp,moisture
+    """
+    lower = path.lower()
+    with open(path, "r", encoding="utf-8") as f:
+        if lower.endswith((".jsonl", ".ndjson")):
+            rows = _read_json_lines(f)
+        elif lower.endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    series = []
+    for row in rows:
+        if row.get("moisture") in (None, ""):
+            continue
+        pump = row.get("pump_status")
+        if isinstance(pump, str):
+            pump = pump.strip().lower() == "true"
+        series.append((parse_time(row["timestamp"]), float(row["moisture"]), pump))
+    series.sort(key=lambda r: r[0])
+    return series
+
+
+def _read_json_lines(f):
+    """Records from a JSON-lines file, skipping blank or partly written lines"""
+    rows = []
+    for line in f:
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(row, dict) and row.get("timestamp"):
+            rows.append(row)
+    return rows
+
+
+def load_pump_events(path):
+    """Load [(epoch, pump_on), ...] from a JSON list as returned by /api/pump/events"""
+    with open(path, "r", encoding="utf-8") as f:
+        return sorted((parse_time(e["timestamp"]), bool(e["pump_on"])) for e in json.load(f))
+
+
+class SoilModel:
+    """
+    Moisture on a fixed time grid, split into what the weather did and
+    what the pump did. Each step applies the recorded exogenous change
+    (drying, rain) and adds `wet_per_step` while the simulated pump runs.
+    """
+
+    def __init__(self, start, step_s, initial, exogenous, wet_per_step, recorded_pump):
+        self.start = start
+        self.step_s = step_s
+        self.initial = initial
+        self.exogenous = exogenous
+        self.wet_per_step = wet_per_step
+        self.recorded_pump = recorded_pump
+
+    @classmethod
+    def from_history(cls, series, pump_events=None, step_s=DEFAULT_STEP_S):
+        if len(series) < 2:
+            raise ValueError("need at least two readings to backtest")
+        start, end = series[0][0], series[-1][0]
+        steps = int((end - start) // step_s) + 1
+
+        # Sample-and-hold the readings and pump state onto the grid
+        moisture = [0.0] * steps
+        pump = [False] * steps
+        events = pump_events or []
+        i = e = 0
+        current_pump = False
+        for k in range(steps):
+            t = start + k * step_s
+            while i + 1 < len(series) and series[i + 1][0] <= t:
+                i += 1
+            moisture[k] = series[i][1]
+            if events:
+                while e < len(events) and events[e][0] <= t:
+                    current_pump = events[e][1]
+                    e += 1
+                pump[k] = current_pump
+            else:
+                pump[k] = bool(series[i][2])
+
+        # Wetting rate while the recorded pump ran
+        wet_gain = [moisture[k + 1] - moisture[k] for k in range(steps - 1) if pump[k]]
+        if wet_gain and sum(wet_gain) > 0:
+            wet_per_step = sum(wet_gain) / len(wet_gain)
+        else:
+            wet_per_step = DEFAULT_WET_RATE * step_s / 60.0
+
+        # Whatever the pump does not explain is weather
+        exogenous = [
+            moisture[k + 1] - moisture[k] - (wet_per_step if pump[k] else 0.0)
+            for k in range(steps - 1)
+        ]
+        return cls(start, step_s, moisture[0], exogenous, wet_per_step, pump[:-1])
+
+
+class HysteresisStrategy:
+    """The firmware's rule: pump on below `low`, off above `high`"""
+
+    params = ("low", "high")
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def valid(self):
+        return self.low < self.high
+
+
+class TimedRunStrategy:
+    """Pump on below `low`, then run for a fixed number of minutes"""
+
+    params = ("low", "run_minutes")
+
+    def __init__(self, low, run_minutes):
+        self.low = low
+        self.run_minutes = run_minutes
+
+    def valid(self):
+        return self.run_minutes > 0
+
+
+STRATEGIES = {
+    "hysteresis": HysteresisStrategy,
+    "timed": TimedRunStrategy,
+}
+
+
+def simulate(model, strategy, stress_threshold=DEFAULT_STRESS_THRESHOLD,
+             flow_rate_lpm=DEFAULT_FLOW_RATE_LPM):
+    """
+    Run one strategy over the model. The per-step loop is kept to local
+    variables and branches because it is the hot path of a sweep.
+    """
+    exo = model.exogenous
+    wet = model.wet_per_step
+    m = model.initial
+    pump = False
+    on_steps = below_steps = cycles = 0
+
+    if isinstance(strategy, HysteresisStrategy):
+        low, high = strategy.low, strategy.high
+        for d in exo:
+            if pump:
+                if m > high:
+                    pump = False
+            elif m < low:
+                pump = True
+                cycles += 1
+            if pump:
+                on_steps += 1
+                m += d + wet
+            else:
+                m += d
+            if m < 0.0:
+                m = 0.0
+            elif m > 100.0:
+                m = 100.0
+            if m < stress_threshold:
+                below_steps += 1
+    elif isinstance(strategy, TimedRunStrategy):
+        low = strategy.low
+        run_steps = max(1, int(strategy.run_minutes * 60 / model.step_s))
+        remaining = 0
+        for d in exo:
+            if remaining == 0 and m < low:
+                remaining = run_steps
+                cycles += 1
+            if remaining:
+                remaining -= 1
+                on_steps += 1
+                m += d + wet
+            else:
+                m += d
+            if m < 0.0:
+                m = 0.0
+            elif m > 100.0:
+                m = 100.0
+            if m < stress_threshold:
+                below_steps += 1
+    else:
+        raise TypeError(f"unknown strategy {type(strategy).__name__}")
+
+    return _metrics(model, on_steps, below_steps, cycles, flow_rate_lpm)
+
+
+def recorded_metrics(model, stress_threshold=DEFAULT_STRESS_THRESHOLD,
+                     flow_rate_lpm=DEFAULT_FLOW_RATE_LPM):
+    """The same metrics for what actually happened, as a baseline"""
+    m = model.initial
+    on_steps = below_steps = cycles = 0
+    prev = False
+    for d, pump in zip(model.exogenous, model.recorded_pump):
+        if pump:
+            on_steps += 1
+            cycles += not prev
+        prev = pump
+        m += d + (model.wet_per_step if pump else 0.0)
+        below_steps += m < stress_threshold
+    return _metrics(model, on_steps, below_steps, cycles, flow_rate_lpm)
+
+
+def _metrics(model, on_steps, below_steps, cycles, flow_rate_lpm):
+    hours = len(model.exogenous) * model.step_s / 3600.0
+    runtime_min = on_steps * model.step_s / 60.0
+    return {
+        "litres": round(runtime_min * flow_rate_lpm, 1),
+        "pump_minutes": round(runtime_min, 1),
+        "hours_below_threshold": round(below_steps * model.step_s / 3600.0, 2),
+        "pump_cycles": cycles,
+        "cycles_per_day": round(cycles / hours * 24, 2) if hours else 0.0,
+    }
+
+
+def _run_chunk(args):
+    model, strategy_name, combos, stress_threshold, flow_rate_lpm = args
+    cls = STRATEGIES[strategy_name]
+    results = []
+    for combo in combos:
+        strategy = cls(*combo)
+        metrics = simulate(model, strategy, stress_threshold, flow_rate_lpm)
+        results.append(dict(zip(cls.params, combo), **metrics))
+    return results
+
+
+def sweep(model, strategy_name, grid, workers=None, stress_threshold=DEFAULT_STRESS_THRESHOLD,
+          flow_rate_lpm=DEFAULT_FLOW_RATE_LPM):
+    """
+    Simulate every valid combination of `grid` (param name -> list of
+    values) and return one result dict per combination. The model is
+    shipped once per chunk, and chunks are spread over a process pool.
+    """
+    cls = STRATEGIES[strategy_name]
+    combos = [c for c in product(*(grid[p] for p in cls.params)) if cls(*c).valid()]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(combos) < 2:
+        return _run_chunk((model, strategy_name, combos, stress_threshold, flow_rate_lpm))
+
+    chunk = max(1, -(-len(combos) // (workers * 4)))
+    jobs = [(model, strategy_name, combos[i:i + chunk], stress_threshold, flow_rate_lpm)
+            for i in range(0, len(combos), chunk)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_run_chunk, jobs):
+            results.extend(part)
+    return results
+
+
+def parse_range(text):
+    """Parse "20:40:5" (start:stop:step, inclusive) or "20,25,30" into a list of numbers"""
+    if ":" in text:
+        start, stop, step = (float(x) for x in text.split(":"))
+        values = []
+        v = start
+        while v <= stop + 1e-9:
+            values.append(round(v, 6))
+            v += step
+        return values
+    return [float(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest irrigation control strategies on recorded history")
+    parser.add_argument("history", help="JSON lines from --record, JSON from /api/history, "
+                                        "or CSV with timestamp,moisture[,pump_status]")
+    parser.add_argument("--pump-events", help="JSON from /api/pump/events")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="hysteresis")
+    parser.add_argument("--low", default="20:40:5", help="dry threshold values, e.g. 20:40:5 or 25,30")
+    parser.add_argument("--high", default="50:80:5", help="wet threshold values (hysteresis)")
+    parser.add_argument("--run-minutes", default="5:30:5", help="run lengths (timed)")
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP_S, help="simulation step in seconds")
+    parser.add_argument("--stress-threshold", type=float, default=DEFAULT_STRESS_THRESHOLD,
+                        help="moisture below which time counts as crop stress")
+    parser.add_argument("--flow-rate", type=float, default=DEFAULT_FLOW_RATE_LPM, help="pump litres per minute")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sort", default="litres",
+                        choices=["litres", "hours_below_threshold", "pump_cycles"])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print all results as JSON")
+    args = parser.parse_args()
+
+    series = load_history(args.history)
+    events = load_pump_events(args.pump_events) if args.pump_events else None
+    model = SoilModel.from_history(series, events, args.step)
+
+    grid = {"low": parse_range(args.low), "high": parse_range(args.high),
+            "run_minutes": parse_range(args.run_minutes)}
+    results = sweep(model, args.strategy, grid, args.workers, args.stress_threshold, args.flow_rate)
+    results.sort(key=lambda r: (r[args.sort], r["hours_below_threshold"]))
+    baseline = recorded_metrics(model, args.stress_threshold, args.flow_rate)
+
+    if args.json:
+        print(json.dumps({"recorded": baseline, "results": results}, indent=2))
+        return
+
+    params = STRATEGIES[args.strategy].params
+    columns = list(params) + ["litres", "pump_minutes", "hours_below_threshold", "pump_cycles", "cycles_per_day"]
+    print(f"{len(series)} readings, {len(model.exogenous)} steps of {model.step_s}s, "
+          f"{len(results)} combinations")
+    print("Recorded: " + ", ".join(f"{k}={v}" for k, v in baseline.items()))
+    widths = [max(len(c), 8) for c in columns]
+    print("  ".join(f"{c:>{w}}" for c, w in zip(columns, widths)))
+    for r in results[:args.top]:
+        print("  ".join(f"{r[c]:>{w}}" for c, w in zip(columns, widths)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Smart Irrigation System - Central Collector
+Keeps the latest state and a bounded history for every site that
+forwards readings to this instance.
+"""
+
+from collections import deque
+from datetime import datetime
+from threading import Lock
+import gzip
+import json
+
+MAX_SITE_HISTORY = 500
+
+
+def decode_batch(body, content_encoding=None):
+    """
+    Decode a (possibly gzip-compressed) batch posted by a Forwarder.
+    Raises OSError or ValueError for anything that is not a well-formed batch.
+    """
+    if content_encoding == "gzip" or body[:2] == b"\x1f\x8b":
+        try:
+            body = gzip.decompress(body)
+        except EOFError:
+            raise ValueError("truncated gzip body")
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("batch must be a JSON object")
+    readings = payload.get("readings")
+    if readings is not None and not (isinstance(readings, list)
+                                     and all(isinstance(r, dict) for r in readings)):
+        raise ValueError("readings must be a list of objects")
+    if readings and not all(isinstance(r.get("zone", ""), str) for r in readings):
+        raise ValueError("reading zone must be a string")
+    if not isinstance(payload.get("site_id", ""), str):
+        raise ValueError("site_id must be a string")
+    return payload
+
+
+class _Site:
+    __slots__ = ("lock", "history", "latest", "last_seen", "readings", "batches")
+
+    def __init__(self, max_history):
+        self.lock = Lock()
+        self.history = deque(maxlen=max_history)
+        self.latest = {}  # zone -> last reading
+        self.last_seen = None
+        self.readings = 0
+        self.batches = 0
+
+
+class SiteRegistry:
+    """
+    Thread-safe store of per-site readings. Each site has its own lock so
+    concurrent gateways only contend on the registry lock when a new site
+    first appears.
+    """
+
+    def __init__(self, max_history=MAX_SITE_HISTORY):
+        self.max_history = max_history
+        self._sites = {}
+        self._lock = Lock()
+
+    def _site(self, site_id):
+        site = self._sites.get(site_id)
+        if site is None:
+            with self._lock:
+                site = self._sites.setdefault(site_id, _Site(self.max_history))
+        return site
+
+    def ingest(self, site_id, readings):
+        """Store a batch of readings from one site; returns the number stored"""
+        site = self._site(site_id)
+        now = datetime.utcnow().isoformat() + "Z"
+        with site.lock:
+            for r in readings:
+                site.history.append(r)
+                site.latest[r.get("zone", "default")] = r
+            site.readings += len(readings)
+            site.batches += 1
+            site.last_seen = now
+        return len(readings)
+
+    def sites(self):
+        """Summary of every site for the cross-site dashboard"""
+        with self._lock:
+            items = list(self._sites.items())
+        result = []
+        for site_id, site in sorted(items):
+            with site.lock:
+                result.append({
+                    "site_id": site_id,
+                    "last_seen": site.last_seen,
+                    "readings": site.readings,
+                    "batches": site.batches,
+                    "zones": dict(site.latest),
+                })
+        return result
+
+    def history(self, site_id, limit=None):
+        site = self._sites.get(site_id)
+        if site is None:
+            return None
+        with site.lock:
+            items = list(site.history)
+        return items[-limit:] if limit else items
@@ -0,0 +1,166 @@
+"""
+Smart Irrigation System - Edge Gateway Forwarder
+Batches readings, gzip-compresses them and POSTs them to a central
+collector. Batches that cannot be delivered are spooled to disk and
+re-sent oldest first once the uplink is back.
+"""
+
+from collections import deque
+from datetime import datetime
+from threading import Event, Lock, Thread
+import gzip
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+COLLECTOR_INGEST_PATH = "/api/collector/ingest"
+
+
+class Forwarder:
+    """
+    Store-and-forward uplink from an edge gateway to a collector.
+    submit() only appends to an in-memory queue; a background thread does
+    all network and disk I/O.
+    """
+
+    def __init__(self, collector_url, site_id, spool_dir="spool", batch_size=100,
+                 flush_interval=5.0, max_queue=10000, timeout=5.0, api_key=None):
+        self.url = collector_url.rstrip("/") + COLLECTOR_INGEST_PATH
+        self.site_id = site_id
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.api_key = api_key
+        self._queue = deque(maxlen=max_queue)  # oldest readings drop first when full
+        self._lock = Lock()
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = None
+        self._backoff = 0.0
+        self.sent = 0
+        self.dropped = 0
+        self.last_error = None
+        self.last_success = None
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def start(self):
+        """Start the background flush thread"""
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush what is queued (spooling on failure) and stop the thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout * 2)
+
+    def submit(self, record):
+        """Queue one reading; never blocks the ingest path on the network"""
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+
+    def status(self):
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            "collector_url": self.url,
+            "site_id": self.site_id,
+            "queued": queued,
+            "spooled_batches": len(self._spool_files()),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval + self._backoff)
+            self._wake.clear()
+            self._flush()
+        self._flush()
+
+    def _take_batch(self):
+        with self._lock:
+            n = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _flush(self):
+        # Drain the spool first so the collector sees readings in order
+        uplink_ok = True
+        for path in self._spool_files():
+            with open(path, "rb") as f:
+                body = f.read()
+            if not self._post(body):
+                uplink_ok = False
+                break
+            os.remove(path)
+
+        # While the uplink is down, everything queued goes to disk
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            body = self._encode(batch)
+            if uplink_ok and self._post(body):
+                continue
+            uplink_ok = False
+            self._spool(body)
+
+    def _encode(self, batch):
+        payload = {"site_id": self.site_id, "sent_at": datetime.utcnow().isoformat() + "Z", "readings": batch}
+        return gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    def _post(self, body):
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "X-Site-Id": self.site_id,
+        }
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        req = urllib.request.Request(self.url, data=body, method="POST", headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            # 404 means the URL is not (yet) a collector: keep the data for when it is
+            if 400 <= e.code < 500 and e.code not in (401, 403, 404, 408, 429):
+                # The collector rejected the batch itself; retrying will not help
+                print(f"Collector rejected batch ({e.code}), dropping it")
+                return True
+            self.last_error = str(e)
+            self._backoff = min(max(self._backoff * 2, 1.0), 60.0)
+            print(f"Forwarding to collector failed: {e}")
+            return False
+        except (urllib.error.URLError, OSError) as e:
+            self.last_error = str(e)
+            self._backoff = min(max(self._backoff * 2, 1.0), 60.0)
+            print(f"Forwarding to collector failed: {e}")
+            return False
+        self._backoff = 0.0
+        self.sent += 1
+        self.last_success = datetime.utcnow().isoformat() + "Z"
+        return True
+
+    def _spool(self, body):
+        name = f"batch-{time.time_ns()}.json.gz"
+        path = os.path.join(self.spool_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+    def _spool_files(self):
+        try:
+            names = sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".json.gz"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.spool_dir, n) for n in names]
@@ -0,0 +1,527 @@
+"""
+Smart Irrigation System - Ingest Engine
+One reader used by every app variant: a transport (serial, TCP or a
+simulator) produces lines, a framer turns them into records, and a
+dispatcher thread hands each record to the configured sinks.
+
+The reader and dispatcher are decoupled by a bounded queue with an
+explicit backpressure policy, and every stage can report its timing.
+"""
+
+from collections import deque
+from datetime import datetime
+from threading import Condition, Lock, Thread
+import json
+import os
+import random
+import socket
+import time
+
+# Backpressure policies for the reader -> dispatcher queue
+DROP_OLDEST = "drop_oldest"   # keep the freshest readings (default)
+DROP_NEWEST = "drop_newest"   # keep what is queued, discard new lines
+BLOCK = "block"               # stop reading; the OS/serial buffer absorbs the burst
+
+
+# --- Transports -----------------------------------------------------------
+
+class SerialTransport:
+    """Arduino over a serial port"""
+
+    def __init__(self, port, baudrate=9600, timeout=1, exclusive=False, reset_delay=2):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.exclusive = exclusive
+        self.reset_delay = reset_delay
+        self._ser = None
+
+    @property
+    def name(self):
+        return self.port
+
+    @property
+    def is_open(self):
+        return self._ser is not None and self._ser.is_open
+
+    def open(self):
+        # Imported here so TCP/simulator setups do not need pyserial
+        import serial
+        kwargs = {"port": self.port, "baudrate": self.baudrate, "timeout": self.timeout, "write_timeout": 1}
+        if self.exclusive:
+            kwargs["exclusive"] = True
+        try:
+            self._ser = serial.Serial(**kwargs)
+        except serial.SerialException as e:
+            if "PermissionError" in str(e) or "Access is denied" in str(e):
+                print("Permission denied. Please try:")
+                print("1. Close Arduino IDE and any other programs using the port")
+                print("2. Unplug and replug the Arduino")
+                print("3. Run this program with administrator privileges")
+            raise
+        time.sleep(self.reset_delay)  # Give Arduino time to reset
+
+    def close(self):
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except Exception:
+                pass
+            self._ser = None
+
+    def readline(self):
+        """Return one line of bytes, or b"" if nothing arrived within the timeout"""
+        return self._ser.readline()
+
+    def write(self, data):
+        self._ser.write(data)
+
+
+class TcpTransport:
+    """
+    Line-oriented TCP stream, e.g. a serial-to-WiFi bridge. Lines are
+    split from recv() output here rather than via socket.makefile(),
+    whose reader becomes unusable after its first timeout.
+    """
+
+    MAX_LINE = 64 * 1024
+
+    def __init__(self, host, port, timeout=1):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._buffer = b""
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    @property
+    def is_open(self):
+        return self._sock is not None
+
+    def open(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=5)
+        self._sock.settimeout(self.timeout)
+        self._buffer = b""
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._buffer = b""
+
+    def readline(self):
+        """One line including its newline, or b"" if none arrived within the timeout"""
+        while True:
+            end = self._buffer.find(b"\n")
+            if end >= 0:
+                line, self._buffer = self._buffer[:end + 1], self._buffer[end + 1:]
+                return line
+            if len(self._buffer) > self.MAX_LINE:
+                self._buffer = b""  # not a line-oriented peer; resync on the next newline
+            try:
+                chunk = self._sock.recv(4096)
+            except socket.timeout:
+                return b""
+            if not chunk:
+                raise ConnectionError("connection closed by peer")
+            self._buffer += chunk
+
+    def write(self, data):
+        self._sock.sendall(data)
+
+
+class SimulatorTransport:
+    """
+    Emits readings like the firmware does, from a simple soil model with
+    the same hysteresis, so the dashboard can run without hardware.
+    Commands written to it (auto_mode, manual_pump) are honoured.
+    """
+
+    def __init__(self, interval=2.0, seed=None, low=30, high=60):
+        self.interval = interval
+        self.low = low
+        self.high = high
+        self._random = random.Random(seed)
+        self._open = False
+        self._moisture = 45.0
+        self._pump = False
+        self._auto = True
+        self._next = 0.0
+
+    @property
+    def name(self):
+        return "simulator"
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def open(self):
+        self._open = True
+        self._next = time.monotonic()
+
+    def close(self):
+        self._open = False
+
+    def readline(self):
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, 1.0))
+            if self._next > time.monotonic():
+                return b""
+        self._next += self.interval
+
+        self._moisture += (1.5 if self._pump else -0.3) + self._random.gauss(0, 0.3)
+        self._moisture = min(max(self._moisture, 0.0), 100.0)
+        if self._auto:
+            if self._moisture < self.low and not self._pump:
+                self._pump = True
+            elif self._moisture > self.high and self._pump:
+                self._pump = False
+        moisture = int(round(self._moisture))
+        # Same mapping as the firmware's rawToPercent(): map(raw, 300, 700, 0, 100)
+        raw = int(round(300 + self._moisture * 4 + self._random.gauss(0, 2)))
+        record = {"moisture": moisture, "raw_value": raw, "pump_status": self._pump,
+                  "threshold_low": self.low, "threshold_high": self.high}
+        return (json.dumps(record) + "\n").encode("utf-8")
+
+    def write(self, data):
+        try:
+            command = json.loads(data)
+        except ValueError:
+            return
+        if "auto_mode" in command:
+            self._auto = bool(command["auto_mode"])
+        if "manual_pump" in command and not self._auto:
+            self._pump = bool(command["manual_pump"])
+
+
+# --- Framing --------------------------------------------------------------
+
+class JsonLineFramer:
+    """One JSON object per line; anything else is logged and skipped"""
+
+    def decode(self, line):
+        text = line.decode("utf-8", errors="replace").strip()
+        if not text:
+            return None
+        if not text.startswith("{"):
+            print(f"Non-JSON data: {text}")
+            return None
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            print(f"Error parsing JSON from Arduino: {text}")
+            return None
+        return record if isinstance(record, dict) else None
+
+    def encode(self, command):
+        return (json.dumps(command) + "\n").encode("utf-8")
+
+
+# --- Sinks ----------------------------------------------------------------
+
+class RingBufferSink:
+    """Latest record plus a bounded in-memory history"""
+
+    def __init__(self, maxlen=500):
+        self.name = "ring"
+        self._lock = Lock()
+        self._items = deque(maxlen=maxlen)
+        self.latest = None
+
+    def write(self, record):
+        with self._lock:
+            self._items.append(record)
+            self.latest = record
+
+    def items(self):
+        with self._lock:
+            return list(self._items)
+
+
+class JsonlFileSink:
+    """Appends every record to a JSON-lines file"""
+
+    def __init__(self, path, flush_every=20):
+        self.name = "file"
+        self.path = path
+        self.flush_every = flush_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending = 0
+
+    def write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._file.flush()
+            self._pending = 0
+
+    def close(self):
+        self._file.close()
+
+
+class PushSink:
+    """
+    Fans records out to subscribers (e.g. a streaming HTTP response).
+    Each subscriber has its own small queue; a slow subscriber loses its
+    oldest records instead of holding up ingest.
+    """
+
+    def __init__(self, maxlen=100):
+        self.name = "push"
+        self.maxlen = maxlen
+        self._lock = Lock()
+        self._subscribers = []
+
+    def subscribe(self):
+        queue = (deque(maxlen=self.maxlen), Condition())
+        with self._lock:
+            self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+
+    def write(self, record):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for items, cond in subscribers:
+            with cond:
+                items.append(record)
+                cond.notify()
+
+    @staticmethod
+    def get(queue, timeout=None):
+        """Wait for the next record for a subscriber; None on timeout"""
+        items, cond = queue
+        with cond:
+            if not items:
+                cond.wait(timeout)
+            return items.popleft() if items else None
+
+
+class CallbackSink:
+    """Calls a function for every record"""
+
+    def __init__(self, func, name=None):
+        self.name = name or getattr(func, "__name__", "callback")
+        self.func = func
+
+    def write(self, record):
+        self.func(record)
+
+
+# --- Engine ---------------------------------------------------------------
+
+class StageTimer:
+    """Count, total and max time per stage"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = {}
+
+    def __call__(self, stage, seconds):
+        with self._lock:
+            s = self._stats.get(stage)
+            if s is None:
+                s = self._stats[stage] = [0, 0.0, 0.0]
+            s[0] += 1
+            s[1] += seconds
+            if seconds > s[2]:
+                s[2] = seconds
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {"count": n, "avg_ms": round(total / n * 1000, 3), "max_ms": round(peak * 1000, 3)}
+                for stage, (n, total, peak) in self._stats.items()
+            }
+
+
+class IngestEngine:
+    """
+    Reads records from a transport and delivers them to sinks.
+
+    - a reader thread owns the transport: reconnects after
+      `retry_interval` seconds, reads lines and frames them into records
+    - a dispatcher thread drains a bounded queue into the sinks, so a slow
+      sink never stalls reading; when the queue is full `backpressure`
+      decides what happens (DROP_OLDEST, DROP_NEWEST or BLOCK)
+    - timing hooks receive (stage, seconds) for "read", "decode",
+      "queue_wait" and "sink:<name>"
+    """
+
+    def __init__(self, transport, sinks=(), framer=None, queue_size=1000,
+                 backpressure=DROP_OLDEST, retry_interval=5.0, on_connect=None):
+        if backpressure not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"unknown backpressure policy: {backpressure}")
+        self.transport = transport
+        self.framer = framer or JsonLineFramer()
+        self.sinks = list(sinks)
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.retry_interval = retry_interval
+        self.on_connect = on_connect
+        self.timer = StageTimer()
+        self._hooks = [self.timer]
+        self._queue = deque()
+        self._cond = Condition()
+        self._write_lock = Lock()
+        self._running = False
+        self._threads = []
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def connected(self):
+        return self.transport.is_open
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def add_timing_hook(self, hook):
+        """hook(stage, seconds) is called from the engine threads; keep it cheap"""
+        self._hooks.append(hook)
+
+    def start(self):
+        self._running = True
+        self._threads = [
+            Thread(target=self._read_loop, name="ingest-reader", daemon=True),
+            Thread(target=self._dispatch_loop, name="ingest-dispatch", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self.transport.close()
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close:
+                close()
+
+    def send(self, command):
+        """Write a command dict to the device; returns False if not connected"""
+        if not self.transport.is_open:
+            return False
+        data = self.framer.encode(command)
+        try:
+            with self._write_lock:
+                self.transport.write(data)
+        except Exception as e:
+            print(f"Error sending command to {self.transport.name}: {e}")
+            return False
+        print(f"Sent to {self.transport.name}: {data.decode('utf-8').strip()}")
+        return True
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "transport": self.transport.name,
+            "connected": self.connected,
+            "received": self.received,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued": queued,
+            "backpressure": self.backpressure,
+            "stages": self.timer.summary(),
+        }
+
+    def _time(self, stage, seconds):
+        for hook in self._hooks:
+            hook(stage, seconds)
+
+    def connect(self):
+        """Open the transport now; the reader thread also reconnects on its own"""
+        try:
+            self.transport.open()
+        except Exception as e:
+            print(f"Failed to connect to {self.transport.name}: {e}")
+            self.transport.close()
+            return False
+        print(f"Connected to {self.transport.name}")
+        if self.on_connect:
+            self.on_connect()
+        return True
+
+    def _read_loop(self):
+        while self._running:
+            if not self.transport.is_open and not self.connect():
+                print(f"Retrying in {self.retry_interval:g} seconds...")
+                time.sleep(self.retry_interval)
+                continue
+            try:
+                t0 = time.perf_counter()
+                line = self.transport.readline()
+                if not line:
+                    continue
+                t1 = time.perf_counter()
+                record = self.framer.decode(line)
+                t2 = time.perf_counter()
+                self._time("read", t1 - t0)
+                self._time("decode", t2 - t1)
+                if record is not None:
+                    self._enqueue(record, t2)
+            except Exception as e:
+                self.errors += 1
+                print(f"Connection error on {self.transport.name}: {e}")
+                self.transport.close()
+                time.sleep(self.retry_interval)
+
+    def _enqueue(self, record, ts):
+        record.setdefault("timestamp", datetime.utcnow().isoformat() + "Z")
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                if self.backpressure == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.backpressure == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    while self._running and len(self._queue) >= self.queue_size:
+                        self._cond.wait(0.5)
+            self._queue.append((ts, record))
+            self.received += 1
+            self._cond.notify_all()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait(0.5)
+                if not self._queue:
+                    return
+                ts, record = self._queue.popleft()
+                self._cond.notify_all()
+            self._time("queue_wait", time.perf_counter() - ts)
+            for sink in self.sinks:
+                t0 = time.perf_counter()
+                try:
+                    sink.write(record)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error in {sink.name} sink: {e}")
+                self._time("sink:" + sink.name, time.perf_counter() - t0)
@@ -0,0 +1,206 @@
+"""
+Smart Irrigation System - Pump Event Log
+Records pump on/off transitions per zone and keeps running duty-cycle
+and water-usage totals for the dashboard
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timezone
+from threading import Lock
+import time
+
+DEFAULT_ZONE = "default"
+DEFAULT_FLOW_RATE_LPM = 2.0  # Litres per minute of a small 3-12V DC pump
+MAX_EVENTS_PER_ZONE = 10000
+MIN_RATE_WINDOW_S = 600  # cycles_per_hour is null until the log spans this long
+
+SOURCE_AUTO = "auto"
+SOURCE_MANUAL = "manual"
+
+
+def to_iso(ts):
+    """Format an epoch timestamp the same way as the history entries"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def parse_time(value):
+    """
+    Parse an epoch number or an ISO 8601 string (with optional trailing Z)
+    into epoch seconds. Returns None for empty values.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    text = str(value)
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    dt = datetime.fromisoformat(text)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class _ZoneLog:
+    """
+    Event list for a single zone.
+
+    Every event stores the cumulative on-time and on-cycle count up to that
+    event, so totals are O(1) and any time range is two bisects.
+    """
+
+    def __init__(self):
+        self.times = []       # epoch seconds, non-decreasing
+        self.states = []      # pump state after the event
+        self.sources = []     # "auto" / "manual"
+        self.cum_runtime = [] # seconds the pump was on before this event
+        self.cum_cycles = []  # on-edges up to and including this event
+        self.pump_on = False
+        self.first_time = None
+
+    def append(self, ts, pump_on, source):
+        if self.times:
+            last = self.times[-1]
+            ts = max(ts, last)  # keep the log monotonic if clocks jitter
+            runtime = self.cum_runtime[-1] + (ts - last if self.states[-1] else 0.0)
+            cycles = self.cum_cycles[-1]
+        else:
+            self.first_time = ts
+            runtime = 0.0
+            cycles = 0
+        if pump_on:
+            cycles += 1
+
+        self.times.append(ts)
+        self.states.append(pump_on)
+        self.sources.append(source)
+        self.cum_runtime.append(runtime)
+        self.cum_cycles.append(cycles)
+        self.pump_on = pump_on
+
+        # Trim oldest events; cumulative values are absolute so they stay valid
+        if len(self.times) > MAX_EVENTS_PER_ZONE:
+            cut = len(self.times) - MAX_EVENTS_PER_ZONE
+            for seq in (self.times, self.states, self.sources, self.cum_runtime, self.cum_cycles):
+                del seq[0:cut]
+        return ts
+
+    def runtime_at(self, ts):
+        """Cumulative pump on-time at an arbitrary time"""
+        i = bisect_right(self.times, ts) - 1
+        if i < 0:
+            return self.cum_runtime[0] if self.cum_runtime else 0.0
+        extra = ts - self.times[i] if self.states[i] else 0.0
+        return self.cum_runtime[i] + extra
+
+    def cycles_at(self, ts):
+        """Number of on-edges up to and including an arbitrary time"""
+        i = bisect_right(self.times, ts) - 1
+        if i < 0:
+            return self.cum_cycles[0] - (1 if self.states[0] else 0) if self.cum_cycles else 0
+        return self.cum_cycles[i]
+
+
+class PumpLog:
+    """Thread-safe pump event log with per-zone aggregates"""
+
+    def __init__(self, flow_rate_lpm=DEFAULT_FLOW_RATE_LPM):
+        self.flow_rate_lpm = flow_rate_lpm
+        self._zones = {}
+        self._lock = Lock()
+
+    def record(self, pump_on, source=SOURCE_AUTO, zone=DEFAULT_ZONE, ts=None):
+        """
+        Record the pump state for a zone. Only edges are stored: repeated
+        reports of the same state are ignored. Returns the event dict or None.
+        """
+        pump_on = bool(pump_on)
+        if ts is None:
+            ts = time.time()
+        with self._lock:
+            log = self._zones.get(zone)
+            if log is None:
+                # A pump that has never been seen on does not need an "off" event
+                if not pump_on:
+                    return None
+                log = self._zones[zone] = _ZoneLog()
+            elif log.pump_on == pump_on:
+                return None
+            ts = log.append(ts, pump_on, source)
+        return {"timestamp": to_iso(ts), "zone": zone, "pump_on": pump_on, "source": source}
+
+    def zones(self):
+        with self._lock:
+            return list(self._zones)
+
+    def totals(self, zone=DEFAULT_ZONE, now=None):
+        """Current runtime, cycle count, cycles per hour and litres for a zone"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            log = self._zones.get(zone)
+            if log is None or not log.times:
+                return self._summary(zone, 0.0, 0, 0.0, False)
+            last = log.times[-1]
+            runtime = log.cum_runtime[-1] + (max(now, last) - last if log.pump_on else 0.0)
+            elapsed = max(now, last) - log.first_time
+            return self._summary(zone, runtime, log.cum_cycles[-1], elapsed, log.pump_on)
+
+    def range_totals(self, start=None, end=None, zone=DEFAULT_ZONE, now=None):
+        """Runtime, cycles and litres for a zone between two epoch timestamps"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            log = self._zones.get(zone)
+            if log is None or not log.times:
+                return self._summary(zone, 0.0, 0, 0.0, False)
+            # Nothing has happened after "now" yet, so do not count into the future
+            latest = max(now, log.times[-1])
+            start = log.times[0] if start is None else min(start, latest)
+            end = latest if end is None else min(end, latest)
+            if end < start:
+                start, end = end, start
+            runtime = log.runtime_at(end) - log.runtime_at(start)
+            cycles = log.cycles_at(end) - log.cycles_at(start)
+            # An edge exactly at `start` belongs to the range
+            i = bisect_right(log.times, start) - 1
+            if i >= 0 and log.times[i] == start and log.states[i]:
+                cycles += 1
+            summary = self._summary(zone, runtime, cycles, end - start, log.pump_on)
+        summary["start"] = to_iso(start)
+        summary["end"] = to_iso(end)
+        return summary
+
+    def events(self, start=None, end=None, zone=DEFAULT_ZONE, limit=None):
+        """Events for a zone between two epoch timestamps, oldest first"""
+        with self._lock:
+            log = self._zones.get(zone)
+            if log is None:
+                return []
+            lo = 0 if start is None else bisect_right(log.times, start - 1e-9)
+            hi = len(log.times) if end is None else bisect_right(log.times, end)
+            if limit is not None and hi - lo > limit:
+                lo = hi - limit
+            return [
+                {
+                    "timestamp": to_iso(log.times[i]),
+                    "zone": zone,
+                    "pump_on": log.states[i],
+                    "source": log.sources[i],
+                }
+                for i in range(lo, hi)
+            ]
+
+    def _summary(self, zone, runtime, cycles, elapsed, pump_on):
+        hours = elapsed / 3600.0
+        return {
+            "zone": zone,
+            "pump_on": pump_on,
+            "runtime_seconds": round(runtime, 1),
+            "cycles": cycles,
+            "cycles_per_hour": round(cycles / hours, 2) if elapsed >= MIN_RATE_WINDOW_S else None,
+            "duty_cycle": round(runtime / elapsed, 4) if elapsed > 0 else 0.0,
+            "litres": round(runtime / 60.0 * self.flow_rate_lpm, 2),
+        }
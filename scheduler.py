@@ -0,0 +1,331 @@
+"""
+Smart Irrigation System - Predictive Scheduler
+Learns each zone's drying and wetting rates from incoming readings,
+projects moisture forward using an optional local forecast file, and
+plans the next pump run ahead of time, preferring off-peak power windows.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timezone
+from threading import Lock
+import csv
+import json
+import time
+
+from pump_log import parse_time, to_iso
+
+# Model fitting
+FORGETTING = 0.98          # older drying samples fade out over ~50 spans
+MIN_DRY_SPAN_S = 600       # fit drying over >= 10 minutes ...
+MIN_DRY_DELTA = 2.0        # ... and >= 2% of change, to beat 1% quantisation
+MAX_DRY_SPAN_S = 2 * 3600  # unless the soil is barely drying at all
+MIN_WET_SPAN_S = 30
+MIN_FIT_SPREAD = 5.0       # moisture std-dev (%) needed before fitting the slope
+MAX_SPAN_S = 6 * 3600
+DEFAULT_DRY_RATE = 0.5     # % per hour until enough data is seen
+DEFAULT_WET_RATE = 1.0     # % per minute of pumping
+
+# Planning
+HORIZON_S = 48 * 3600
+STEP_S = 900
+REPLAN_INTERVAL_S = 300
+MIN_RUN_S = 60
+MAX_RUN_S = 1800
+
+# Forecast effect on drying
+REF_TEMP_C = 20.0
+TEMP_COEFF = 0.04          # +4% drying per degree above the reference
+RAIN_GAIN_PCT_PER_MM = 2.0
+
+
+def parse_windows(text):
+    """Parse off-peak windows like "22-6,12-14" into [(22, 6), (12, 14)] hours"""
+    windows = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if part:
+            start, end = part.split("-")
+            windows.append((int(start) % 24, int(end) % 24))
+    return windows
+
+
+def load_forecast(path):
+    """
+    Load a forecast file (CSV with a header, or JSON list / {"forecast": [...]})
+    with a "time" column plus optional "temperature_c" and "rain_mm" per hour.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            rows = data.get("forecast", []) if isinstance(data, dict) else data
+        else:
+            rows = list(csv.DictReader(f))
+    return Forecast(rows)
+
+
+class Forecast:
+    """Hourly forecast looked up by bisecting on time"""
+
+    def __init__(self, rows=()):
+        entries = []
+        for row in rows:
+            try:
+                t = parse_time(row["time"])
+            except (KeyError, ValueError):
+                continue
+            entries.append((t, _float(row.get("temperature_c")), _float(row.get("rain_mm")) or 0.0))
+        entries.sort()
+        self._times = [e[0] for e in entries]
+        self._entries = entries
+
+    def at(self, ts):
+        """(temperature_c or None, rain_mm) for the hour containing ts"""
+        i = bisect_right(self._times, ts) - 1
+        if i < 0 or ts - self._times[i] >= 3600:
+            return None, 0.0
+        return self._entries[i][1], self._entries[i][2]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ZoneModel:
+    """
+    Drying modelled as dm/dt = -(a + b*m) %/hour, fitted by recursive
+    weighted least squares with forgetting; wetting as an EWMA of %/minute
+    while the pump runs. Each reading is O(1).
+    """
+
+    def __init__(self):
+        # Weighted sums for the 2x2 normal equations
+        self.s_w = self.s_m = self.s_mm = self.s_y = self.s_my = 0.0
+        self.a = DEFAULT_DRY_RATE
+        self.b = 0.0
+        self.wet_rate = DEFAULT_WET_RATE
+        self.dry_samples = 0
+        self.wet_samples = 0
+        self.anchor = None   # (ts, moisture, pump_on) start of the current span
+        self.last = None
+
+    def observe(self, ts, moisture, pump_on):
+        """Feed one reading; returns True when the fitted rates changed"""
+        self.last = (ts, moisture, pump_on)
+        if self.anchor is None or self.anchor[2] != pump_on or ts - self.anchor[0] > MAX_SPAN_S:
+            self.anchor = (ts, moisture, pump_on)
+            return False
+
+        t0, m0, _ = self.anchor
+        span = ts - t0
+        if pump_on:
+            if span < MIN_WET_SPAN_S:
+                return False
+            rate = (moisture - m0) / (span / 60.0)
+            if rate > 0:
+                if self.wet_samples:
+                    self.wet_rate += 0.2 * (rate - self.wet_rate)
+                else:
+                    self.wet_rate = rate
+                self.wet_samples += 1
+        else:
+            if span < MIN_DRY_SPAN_S or (abs(m0 - moisture) < MIN_DRY_DELTA and span < MAX_DRY_SPAN_S):
+                return False
+            self._add_dry_sample((m0 + moisture) / 2.0, (m0 - moisture) / (span / 3600.0))
+        self.anchor = (ts, moisture, pump_on)
+        return True
+
+    def _add_dry_sample(self, m, y):
+        f = FORGETTING
+        self.s_w = self.s_w * f + 1.0
+        self.s_m = self.s_m * f + m
+        self.s_mm = self.s_mm * f + m * m
+        self.s_y = self.s_y * f + y
+        self.s_my = self.s_my * f + m * y
+        self.dry_samples += 1
+
+        det = self.s_w * self.s_mm - self.s_m * self.s_m
+        # det / s_w^2 is the weighted variance of m; without enough spread the
+        # slope is noise and extrapolates badly, so fall back to a constant rate
+        if self.dry_samples >= 3 and det > (MIN_FIT_SPREAD ** 2) * self.s_w * self.s_w:
+            self.b = (self.s_w * self.s_my - self.s_m * self.s_y) / det
+            self.a = (self.s_y - self.b * self.s_m) / self.s_w
+            if self.a < 0:
+                # Drying must not stop above 0%: fit through the origin instead
+                self.a, self.b = 0.0, max(self.s_my / self.s_mm, 0.0)
+            if self.b < 0:
+                self.a, self.b = self.s_y / self.s_w, 0.0
+        else:
+            self.a = self.s_y / self.s_w
+            self.b = 0.0
+
+    def drying_rate(self, m):
+        """Predicted drying in % per hour at moisture m (never negative)"""
+        return max(self.a + self.b * m, 0.0)
+
+    def to_dict(self):
+        return {
+            "drying_rate_a": round(self.a, 4),
+            "drying_rate_b": round(self.b, 5),
+            "wet_rate_pct_per_min": round(self.wet_rate, 3),
+            "dry_samples": self.dry_samples,
+            "wet_samples": self.wet_samples,
+        }
+
+
+class Scheduler:
+    """
+    Keeps a ZoneModel per zone and re-plans at most every
+    REPLAN_INTERVAL_S, or immediately when the moisture is already
+    below the dry threshold.
+    """
+
+    def __init__(self, forecast=None, off_peak=None):
+        self.forecast = forecast or Forecast()
+        self.off_peak = off_peak or []
+        self._zones = {}
+        self._plans = {}
+        self._pushed = {}   # zone -> last plan the device actually received
+        self._planned_at = {}
+        self._lock = Lock()
+
+    def observe(self, zone, moisture, pump_on, threshold_low, threshold_high, ts=None):
+        """
+        Feed a reading. Returns the plan for the zone if it differs enough
+        from what was last pushed to the device (with "start" None when a
+        pushed run is no longer needed), otherwise None. Call mark_pushed()
+        once the plan has been delivered.
+        """
+        if ts is None:
+            ts = time.time()
+        with self._lock:
+            model = self._zones.get(zone)
+            if model is None:
+                model = self._zones[zone] = ZoneModel()
+            model.observe(ts, moisture, pump_on)
+
+            due = ts - self._planned_at.get(zone, 0) >= REPLAN_INTERVAL_S
+            if due or (moisture < threshold_low and not pump_on):
+                self._planned_at[zone] = ts
+                self._plans[zone] = self._plan(model, zone, ts, moisture, threshold_low, threshold_high)
+            return self._unpushed(zone, ts)
+
+    def _unpushed(self, zone, ts):
+        plan = self._plans.get(zone)
+        pushed = self._pushed.get(zone)
+        if pushed and plan:
+            # Far-off plans wobble as the fit settles; only push real changes
+            tolerance = max(STEP_S, 0.1 * (pushed["start"] - ts))
+            if abs(pushed["start"] - plan["start"]) < tolerance \
+                    and abs(pushed["duration_s"] - plan["duration_s"]) < MIN_RUN_S * 5:
+                return None
+        if pushed is None and plan is None:
+            return None
+        return plan or {"zone": zone, "start": None, "duration_s": 0}
+
+    def mark_pushed(self, zone, plan):
+        """Record that the device received `plan` (a cancel clears it)"""
+        with self._lock:
+            if plan and plan.get("start") is not None:
+                self._pushed[zone] = plan
+            else:
+                self._pushed.pop(zone, None)
+
+    def pending(self, now=None):
+        """
+        Current plans the device should hold, e.g. to re-arm it after a
+        reset or when auto mode is switched back on. Each returned plan is
+        forgotten as pushed, so it must be pushed and marked again. Plans
+        whose start has passed may already have run and are left as they
+        are; if still needed, the next re-plan produces a new one.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            result = []
+            for zone, plan in self._plans.items():
+                if plan and plan["start"] >= now:
+                    self._pushed.pop(zone, None)
+                    result.append(plan)
+            return result
+
+    def plans(self):
+        with self._lock:
+            return {
+                zone: {
+                    "plan": self._public(self._plans.get(zone)),
+                    "model": model.to_dict(),
+                }
+                for zone, model in self._zones.items()
+            }
+
+    def _plan(self, model, zone, now, moisture, low, high):
+        """Project moisture forward and pick a start time and run length"""
+        m = float(moisture)
+        t = now
+        trajectory = [(t, m)]
+        cross = None
+        while t < now + HORIZON_S:
+            temp, rain = self.forecast.at(t)
+            factor = 1.0 if temp is None else min(max(1.0 + TEMP_COEFF * (temp - REF_TEMP_C), 0.2), 3.0)
+            m -= model.drying_rate(m) * factor * (STEP_S / 3600.0)
+            m += rain * RAIN_GAIN_PCT_PER_MM * (STEP_S / 3600.0)
+            m = min(max(m, 0.0), 100.0)
+            t += STEP_S
+            trajectory.append((t, m))
+            if m < low:
+                cross = t
+                break
+        if cross is None:
+            return None
+
+        if moisture < low:
+            start, reason = now, "below dry threshold"
+        else:
+            start = self._latest_off_peak_start(now, cross)
+            reason = "off-peak window before predicted dry-out"
+            if start is None:
+                start, reason = max(now, cross - STEP_S), "predicted dry-out"
+
+        # Moisture expected at the start, from the projected trajectory
+        i = min(int((start - now) // STEP_S), len(trajectory) - 1)
+        m_start = trajectory[i][1]
+        duration = (high - m_start) / max(model.wet_rate, 0.01) * 60.0
+        duration = int(min(max(duration, MIN_RUN_S), MAX_RUN_S))
+        return {
+            "zone": zone,
+            "start": start,
+            "duration_s": duration,
+            "predicted_dry_at": cross,
+            "predicted_moisture_at_start": round(m_start, 1),
+            "reason": reason,
+        }
+
+    def _latest_off_peak_start(self, now, deadline):
+        """Latest moment inside an off-peak window in [now, deadline)"""
+        best = None
+        t = now
+        while t < deadline:
+            hour = datetime.fromtimestamp(t, tz=timezone.utc).astimezone().hour
+            if any(_in_window(hour, w) for w in self.off_peak):
+                best = t
+            t += STEP_S
+        return best
+
+    @staticmethod
+    def _public(plan):
+        if not plan:
+            return plan
+        result = dict(plan)
+        result["start"] = to_iso(plan["start"])
+        result["predicted_dry_at"] = to_iso(plan["predicted_dry_at"])
+        return result
+
+
+def _in_window(hour, window):
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
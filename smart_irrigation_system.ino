@@ -1,6 +1,15 @@
 /*
 Smart Irrigation System - Arduino Code
 Reads soil moisture and controls water pump relay
+
+The sensor is oversampled (10 Hz by default) and one aggregated record
+with mean/min/max/stddev is reported per report interval. Both rates can
+be changed at runtime with a JSON command line from the server, e.g.
+  {"sample_rate_hz": 10, "report_interval_ms": 2000}
+
+The server's scheduler can also arm one timed pump run ahead of time:
+  {"schedule_in_s": 3600, "schedule_run_s": 300}
+A run of 0 seconds cancels it. Scheduled runs only happen in auto mode.
 */
 
 const int SOIL_MOISTURE_PIN = A0;
@@ -9,36 +18,188 @@ const int RELAY_PIN = 7;
 int soilMoistureValue = 0;
 int soilMoisturePercent = 0;
 bool pumpStatus = false;
+bool autoMode = true;
 
 const int DRY_THRESHOLD = 30;
 const int WET_THRESHOLD = 60;
 
-void setup() {
-  Serial.begin(9600);
-  pinMode(RELAY_PIN, OUTPUT);
-  digitalWrite(RELAY_PIN, HIGH);
-  Serial.println("Smart Irrigation System Started");
-  delay(1000);
+const unsigned int MIN_SAMPLE_RATE_HZ = 1;
+const unsigned int MAX_SAMPLE_RATE_HZ = 50;
+const unsigned long MIN_REPORT_INTERVAL_MS = 500;
+const unsigned long MAX_REPORT_INTERVAL_MS = 60000;
+
+unsigned int sampleRateHz = 10;
+unsigned long sampleIntervalMs = 100;
+unsigned long reportIntervalMs = 2000;
+
+unsigned long lastSampleMs = 0;
+unsigned long lastReportMs = 0;
+
+// Running aggregates for the current report interval. Sums are taken
+// around the first sample of the interval so the variance is computed
+// from small numbers and does not cancel out in 32-bit floats.
+unsigned int sampleCount = 0;
+int rawOffset = 0;
+long rawSum = 0;
+unsigned long rawSumSq = 0;
+int rawMin = 1023;
+int rawMax = 0;
+
+// Scheduled run pushed by the server
+bool scheduleArmed = false;
+bool scheduleRunning = false;
+unsigned long scheduleSetMs = 0;
+unsigned long scheduleInMs = 0;
+unsigned long scheduleRunMs = 0;
+unsigned long scheduleStartedMs = 0;
+
+String commandBuffer = "";
+
+int rawToPercent(long raw) {
+  return constrain(map(raw, 300, 700, 0, 100), 0, 100);
 }
 
-void loop() {
-  soilMoistureValue = analogRead(SOIL_MOISTURE_PIN);
-  soilMoisturePercent = map(soilMoistureValue, 300, 700, 0, 100);
-  soilMoisturePercent = constrain(soilMoisturePercent, 0, 100);
+void resetAggregates() {
+  sampleCount = 0;
+  rawSum = 0;
+  rawSumSq = 0;
+  rawMin = 1023;
+  rawMax = 0;
+}
+
+void setPump(bool on) {
+  digitalWrite(RELAY_PIN, on ? LOW : HIGH);
+  pumpStatus = on;
+}
+
+// Minimal lookup of `"key": value` in a flat JSON object.
+// Returns true and stores the text after the colon if the key is present.
+bool jsonValue(const String& json, const char* key, String& value) {
+  String pattern = String("\"") + key + "\"";
+  int pos = json.indexOf(pattern);
+  if (pos < 0) return false;
+  pos = json.indexOf(':', pos + pattern.length());
+  if (pos < 0) return false;
+  int end = pos + 1;
+  while (end < (int)json.length() && json[end] != ',' && json[end] != '}') end++;
+  value = json.substring(pos + 1, end);
+  value.trim();
+  return true;
+}
+
+void handleCommand(const String& line) {
+  String value;
+  if (jsonValue(line, "sample_rate_hz", value)) {
+    sampleRateHz = constrain(value.toInt(), MIN_SAMPLE_RATE_HZ, MAX_SAMPLE_RATE_HZ);
+    sampleIntervalMs = 1000UL / sampleRateHz;
+  }
+  if (jsonValue(line, "report_interval_ms", value)) {
+    reportIntervalMs = constrain(value.toInt(), (long)MIN_REPORT_INTERVAL_MS, (long)MAX_REPORT_INTERVAL_MS);
+  }
+  if (jsonValue(line, "auto_mode", value)) {
+    autoMode = value == "true";
+  }
+  if (jsonValue(line, "manual_pump", value) && !autoMode) {
+    setPump(value == "true");
+  }
+  if (jsonValue(line, "schedule_run_s", value)) {
+    scheduleRunMs = value.toInt() * 1000UL;
+    scheduleInMs = 0;
+    if (jsonValue(line, "schedule_in_s", value)) {
+      scheduleInMs = value.toInt() * 1000UL;
+    }
+    scheduleSetMs = millis();
+    scheduleArmed = scheduleRunMs > 0;
+    if (scheduleRunning) {
+      scheduleRunning = false;
+      setPump(false);
+    }
+  }
+}
 
-  if (soilMoisturePercent < DRY_THRESHOLD && !pumpStatus) {
-    digitalWrite(RELAY_PIN, LOW);
-    pumpStatus = true;
-  } else if (soilMoisturePercent > WET_THRESHOLD && pumpStatus) {
-    digitalWrite(RELAY_PIN, HIGH);
-    pumpStatus = false;
+void runSchedule(unsigned long now) {
+  if (!autoMode) {
+    scheduleArmed = false;
+    scheduleRunning = false;
+    return;
   }
+  if (scheduleArmed && now - scheduleSetMs >= scheduleInMs) {
+    scheduleArmed = false;
+    scheduleRunning = true;
+    scheduleStartedMs = now;
+    setPump(true);
+  }
+  if (scheduleRunning && now - scheduleStartedMs >= scheduleRunMs) {
+    scheduleRunning = false;
+    setPump(false);
+  }
+}
+
+void readCommands() {
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n') {
+      handleCommand(commandBuffer);
+      commandBuffer = "";
+    } else if (commandBuffer.length() < 96) {
+      commandBuffer += c;
+    }
+  }
+}
+
+void takeSample() {
+  int raw = analogRead(SOIL_MOISTURE_PIN);
+  if (sampleCount == 0) rawOffset = raw;
+  long d = raw - rawOffset;
+  sampleCount++;
+  rawSum += d;
+  rawSumSq += (unsigned long)(d * d);
+  if (raw < rawMin) rawMin = raw;
+  if (raw > rawMax) rawMax = raw;
+}
+
+void report() {
+  if (sampleCount == 0) return;
+
+  float meanOffset = (float)rawSum / sampleCount;
+  float rawMean = rawOffset + meanOffset;
+  float rawVar = (float)rawSumSq / sampleCount - meanOffset * meanOffset;
+  float rawStd = rawVar > 0 ? sqrt(rawVar) : 0;
+
+  soilMoistureValue = (int)(rawMean + 0.5);
+  soilMoisturePercent = rawToPercent(soilMoistureValue);
 
+  // Hysteresis on the averaged value, so single noisy samples cannot toggle the pump
+  if (autoMode && !scheduleRunning) {
+    if (soilMoisturePercent < DRY_THRESHOLD && !pumpStatus) {
+      setPump(true);
+    } else if (soilMoisturePercent > WET_THRESHOLD && pumpStatus) {
+      setPump(false);
+    }
+  }
+
+  // rawToPercent() increases with the raw value, so raw min/max map straight across
   Serial.print("{");
   Serial.print("\"moisture\": ");
   Serial.print(soilMoisturePercent);
   Serial.print(", \"raw_value\": ");
   Serial.print(soilMoistureValue);
+  Serial.print(", \"raw_min\": ");
+  Serial.print(rawMin);
+  Serial.print(", \"raw_max\": ");
+  Serial.print(rawMax);
+  Serial.print(", \"raw_std\": ");
+  Serial.print(rawStd, 2);
+  Serial.print(", \"moisture_min\": ");
+  Serial.print(rawToPercent(rawMin));
+  Serial.print(", \"moisture_max\": ");
+  Serial.print(rawToPercent(rawMax));
+  Serial.print(", \"moisture_std\": ");
+  Serial.print(rawStd * 100.0 / 400.0, 2);
+  Serial.print(", \"samples\": ");
+  Serial.print(sampleCount);
+  Serial.print(", \"interval_ms\": ");
+  Serial.print(reportIntervalMs);
   Serial.print(", \"pump_status\": ");
   Serial.print(pumpStatus ? "true" : "false");
   Serial.print(", \"threshold_low\": ");
@@ -47,5 +208,29 @@ void loop() {
   Serial.print(WET_THRESHOLD);
   Serial.println("}");
 
-  delay(2000);
+  resetAggregates();
+}
+
+void setup() {
+  Serial.begin(9600);
+  pinMode(RELAY_PIN, OUTPUT);
+  digitalWrite(RELAY_PIN, HIGH);
+  Serial.println("Smart Irrigation System Started");
+  delay(1000);
+  lastSampleMs = lastReportMs = millis();
+}
+
+void loop() {
+  readCommands();
+
+  unsigned long now = millis();
+  if (now - lastSampleMs >= sampleIntervalMs) {
+    lastSampleMs = now;
+    takeSample();
+  }
+  runSchedule(now);
+  if (now - lastReportMs >= reportIntervalMs) {
+    lastReportMs = now;
+    report();
+  }
 }
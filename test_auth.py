@@ -0,0 +1,126 @@
+"""
+Tests for API keys, zone scoping and rate limiting, including the Flask
+access checks in app.py
+"""
+
+import json
+
+import pytest
+
+from auth import ALL_ZONES, SCOPE_READ, SCOPE_WRITE, ApiKeyStore, RateLimiter
+from collector import SiteRegistry
+from pump_log import PumpLog
+
+KEYS = {
+    "north-key": {"client": "north-gw", "zones": ["north"]},
+    "reader-key": {"client": "dashboard", "zones": ["default"], "scopes": ["read"]},
+    "admin-key": {"client": "operator", "zones": ALL_ZONES},
+}
+
+
+def test_allows_checks_scope_and_zone():
+    store = ApiKeyStore(KEYS)
+    north = store.authenticate("north-key")
+    reader = store.authenticate("reader-key")
+    admin = store.authenticate("admin-key")
+    assert ApiKeyStore.allows(north, SCOPE_WRITE, "north")
+    assert not ApiKeyStore.allows(north, SCOPE_READ, "south")
+    assert ApiKeyStore.allows(reader, SCOPE_READ, "default")
+    assert not ApiKeyStore.allows(reader, SCOPE_WRITE, "default")
+    assert ApiKeyStore.allows(admin, SCOPE_WRITE, "anything")
+    assert store.authenticate("wrong") is None
+    assert store.authenticate(None) is None
+
+
+def test_rate_limiter_throttles_after_burst():
+    limiter = RateLimiter(write_rate=(1.0, 3))
+    assert [limiter.check("a", SCOPE_WRITE) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.check("a", SCOPE_WRITE) > 0
+    assert limiter.check("b", SCOPE_WRITE) == 0.0
+
+
+# --- Access checks in the Flask app ---------------------------------------
+
+@pytest.fixture
+def app_module(monkeypatch):
+    app = pytest.importorskip("app")
+    monkeypatch.setattr(app, "_api_keys", ApiKeyStore(KEYS))
+    monkeypatch.setattr(app, "_rate_limiter", RateLimiter(read_rate=(1000.0, 1000), write_rate=(1000.0, 1000)))
+    monkeypatch.setattr(app, "_mode", app.MODE_COLLECTOR)
+    monkeypatch.setattr(app, "_sites", SiteRegistry())
+    monkeypatch.setattr(app, "_pump_log", PumpLog())
+    return app
+
+
+def _post_batch(client, key, body, site_header=None):
+    headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+    if site_header:
+        headers["X-Site-Id"] = site_header
+    return client.post("/api/collector/ingest", data=json.dumps(body), headers=headers)
+
+
+def test_batch_without_site_header_is_refused(app_module):
+    client = app_module.app.test_client()
+    batch = {"site_id": "south", "readings": [{"moisture": 40}]}
+    assert _post_batch(client, "north-key", batch).status_code == 400
+    assert app_module._sites.history("south") is None
+
+
+def test_batch_for_another_site_is_refused(app_module):
+    client = app_module.app.test_client()
+    batch = {"site_id": "south", "readings": [{"moisture": 40}]}
+    assert _post_batch(client, "north-key", batch, site_header="north").status_code == 403
+    assert _post_batch(client, "north-key", batch, site_header="south").status_code == 403
+    assert app_module._sites.history("south") is None
+
+    batch["site_id"] = "north"
+    response = _post_batch(client, "north-key", batch, site_header="north")
+    assert response.status_code == 200
+    assert response.get_json()["stored"] == 1
+
+
+def test_site_history_and_listing_follow_key_zones(app_module):
+    app_module._sites.ingest("north", [{"moisture": 40}])
+    app_module._sites.ingest("south", [{"moisture": 50}])
+    client = app_module.app.test_client()
+    auth = {"Authorization": "Bearer north-key"}
+
+    assert client.get("/api/sites/south/history?zone=north", headers=auth).status_code == 403
+    assert client.get("/api/sites/north/history", headers=auth).status_code == 200
+    sites = client.get("/api/sites", headers=auth).get_json()
+    assert [s["site_id"] for s in sites] == ["north"]
+
+
+def test_pump_stats_listing_follows_key_zones(app_module):
+    app_module._pump_log.record(True, zone="default", ts=1000)
+    app_module._pump_log.record(True, zone="north", ts=1000)
+    client = app_module.app.test_client()
+    stats = client.get("/api/pump/stats", headers={"Authorization": "Bearer reader-key"}).get_json()
+    assert [z["zone"] for z in stats["zones"]] == ["default"]
+    response = client.get("/api/pump/stats?zone=north", headers={"Authorization": "Bearer reader-key"})
+    assert response.status_code == 403
+
+
+def test_unauthenticated_rate_limit_ignores_site_header(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "_api_keys", ApiKeyStore())
+    monkeypatch.setattr(app_module, "_rate_limiter", RateLimiter(write_rate=(0.001, 5)))
+    client = app_module.app.test_client()
+    codes = []
+    for i in range(10):
+        site = f"site-{i}"
+        response = client.post("/api/collector/ingest", headers={"X-Site-Id": site},
+                               data=json.dumps({"site_id": site, "readings": []}))
+        codes.append(response.status_code)
+    assert codes.count(429) == 5
+
+
+def test_schedule_listing_follows_key_zones(app_module, monkeypatch):
+    scheduler = app_module.Scheduler()
+    for zone in ("north", "south"):
+        scheduler.observe(zone, 50, False, 30, 60, ts=1000)
+    monkeypatch.setattr(app_module, "_scheduler", scheduler)
+    client = app_module.app.test_client()
+    auth = {"Authorization": "Bearer north-key"}
+    assert list(client.get("/api/schedule?zone=north", headers=auth).get_json()) == ["north"]
+    assert list(client.get("/api/schedule", headers=auth).get_json()) == ["north"]
+    assert client.get("/api/schedule?zone=south", headers=auth).status_code == 403
@@ -0,0 +1,82 @@
+"""
+Tests for the TCP transport of the ingest engine, against a loopback socket
+"""
+
+import json
+import socket
+import threading
+import time
+
+from ingest import IngestEngine, RingBufferSink, TcpTransport
+
+
+def _serve(chunks, gap):
+    """Accept one client on a loopback port and send `chunks` `gap` seconds apart"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def run():
+        conn, _ = server.accept()
+        with conn:
+            for chunk in chunks:
+                time.sleep(gap)
+                conn.sendall(chunk)
+            time.sleep(0.2)
+        server.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def _record(i):
+    return (json.dumps({"moisture": 40 + i, "pump_status": False}) + "\n").encode("utf-8")
+
+
+def test_readline_survives_pauses_longer_than_timeout():
+    port = _serve([_record(i) for i in range(4)], gap=0.5)
+    transport = TcpTransport("127.0.0.1", port, timeout=0.1)
+    transport.open()
+    try:
+        lines = []
+        deadline = time.monotonic() + 5
+        while len(lines) < 4 and time.monotonic() < deadline:
+            line = transport.readline()
+            if line:
+                lines.append(line)
+    finally:
+        transport.close()
+    assert lines == [_record(i) for i in range(4)]
+
+
+def test_readline_joins_lines_split_across_packets():
+    data = _record(1) + _record(2)
+    port = _serve([data[:7], data[7:30], data[30:]], gap=0.2)
+    transport = TcpTransport("127.0.0.1", port, timeout=0.05)
+    transport.open()
+    try:
+        lines = []
+        deadline = time.monotonic() + 5
+        while len(lines) < 2 and time.monotonic() < deadline:
+            line = transport.readline()
+            if line:
+                lines.append(line)
+    finally:
+        transport.close()
+    assert lines == [_record(1), _record(2)]
+
+
+def test_engine_keeps_connection_across_slow_reports():
+    port = _serve([_record(i) for i in range(3)], gap=0.4)
+    ring = RingBufferSink()
+    engine = IngestEngine(TcpTransport("127.0.0.1", port, timeout=0.1), [ring])
+    engine.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(ring.items()) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = engine.stats()
+    finally:
+        engine.stop()
+    assert [r["moisture"] for r in ring.items()] == [40, 41, 42]
+    assert stats["errors"] == 0
@@ -0,0 +1,34 @@
+"""
+Tests for which plans the scheduler offers to push to the device
+"""
+
+from scheduler import REPLAN_INTERVAL_S, Scheduler
+
+
+def _planned(scheduler, zone="z", ts=1000.0):
+    """Feed one reading that produces a plan for a soon-to-dry zone"""
+    return scheduler.observe(zone, 31, False, 30, 60, ts=ts)
+
+
+def test_plan_not_pushed_is_offered_again():
+    scheduler = Scheduler()
+    plan = _planned(scheduler)
+    assert plan is not None and plan["start"] is not None
+    # The caller could not deliver it (pump running, disconnected...)
+    assert scheduler.observe("z", 31, False, 30, 60, ts=1010.0) == plan
+    scheduler.mark_pushed("z", plan)
+    assert scheduler.observe("z", 31, False, 30, 60, ts=1020.0) is None
+
+
+def test_pending_skips_plans_that_already_started():
+    scheduler = Scheduler()
+    plan = _planned(scheduler)
+    scheduler.mark_pushed("z", plan)
+
+    assert scheduler.pending(now=plan["start"] - 1) == [plan]
+    scheduler.mark_pushed("z", plan)
+
+    # After the start the run may already have happened: do not re-arm it,
+    # and do not offer it again on the next reading either
+    assert scheduler.pending(now=plan["start"] + 600) == []
+    assert scheduler.observe("z", 31, False, 30, 60, ts=1000.0 + REPLAN_INTERVAL_S - 1) is None